@@ -1,15 +1,753 @@
+import base64
+import csv
+import json
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import InterfaceError, PoolError
 import os
-from datetime import datetime
+import queue
+import re
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
 from dotenv import load_dotenv, find_dotenv
 dotenv_path = find_dotenv()
 load_dotenv(dotenv_path, override=True)
 
 from db_help.log import Log
+from db_help.mysql_delta import apply_delta, encode_delta, is_delta, parse_delta
+from db_help.mysql_export import check_export_options, iter_import_rows, open_export_writer
 logger = Log.logger
 editing_logger = logger.info
 
+# 表示连接已断开的客户端错误码: CR_SERVER_GONE_ERROR, CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED
+CONNECTION_LOST_ERRNOS = {2006, 2013, 2055}
+# 并发分配版本号时可重试的错误：1062 重复键 (有 (name, version) 唯一索引时)，1213 死锁
+VERSION_RETRY_ERRNOS = {1062, 1213}
+# 可安全重试的只读语句前缀
+READ_ONLY_PREFIXES = ("SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN", "WITH")
+# count_by_time 的分桶表达式 (桶的起始时间)
+TIME_BUCKETS = {
+    "hour": "DATE_ADD(DATE({column}), INTERVAL HOUR({column}) HOUR)",
+    "day": "DATE({column})",
+}
+
+
+def is_connection_error(error):
+    """
+    判断异常是否表示连接已断开。
+    """
+    return getattr(error, "errno", None) in CONNECTION_LOST_ERRNOS
+
+
+def is_read_only_query(query):
+    """
+    判断 SQL 是否为可安全重试的只读语句。
+    """
+    return query.lstrip(" \t\r\n(").upper().startswith(READ_ONLY_PREFIXES)
+
+
+_WRITTEN_TABLE_RE = re.compile(
+    r"^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+IGNORE)?|DELETE\s+FROM)\s+([`\w.]+)",
+    re.IGNORECASE,
+)
+
+
+def written_table(query):
+    """
+    从单表 INSERT/REPLACE/UPDATE/DELETE 语句中解析被写入的表名，无法解析时返回 None。
+    """
+    match = _WRITTEN_TABLE_RE.match(query)
+    return match.group(1) if match else None
+
+
+def estimate_row_size(row):
+    """
+    估算一行数据拼入 SQL 后的字节数 (偏保守)，用于按 max_allowed_packet 切分批次。
+    """
+    size = 3  # "(", ")", ","
+    if isinstance(row, dict):
+        row = row.values()
+    for value in row:
+        if value is None:
+            size += 5
+        elif isinstance(value, str):
+            size += len(value.encode("utf-8")) + 3
+        elif isinstance(value, (bytes, bytearray)):
+            size += 2 * len(value) + 3  # 二进制数据转义后最多翻倍
+        else:
+            size += len(str(value)) + 3
+    return size
+
+
+def chunk_rows(rows, max_bytes, max_rows):
+    """
+    将任意可迭代的行切分为列表批次，每批估算字节数不超过 max_bytes、行数不超过 max_rows。
+    单行超过 max_bytes 时单独成批。
+    """
+    chunk = []
+    chunk_bytes = 0
+    for row in rows:
+        row_bytes = estimate_row_size(row)
+        if chunk and (chunk_bytes + row_bytes > max_bytes or len(chunk) >= max_rows):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if chunk:
+        yield chunk
+
+
+ROW_FORMATS = ("dict", "tuple", "named", "columnar", "numpy")
+
+
+# --- SQL 模板缓存：相同 (表, 列集合, 子句形状) 只拼接一次，并返回同一个字符串对象，
+# 便于预处理语句游标按对象身份复用 ---
+
+@lru_cache(maxsize=1024)
+def insert_sql(table_name, columns):
+    """
+    :param columns: 列名元组。
+    """
+    placeholders = ", ".join(["%s"] * len(columns))
+    return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+@lru_cache(maxsize=1024)
+def select_sql(table_name, columns="*", conditions=None, order_by=None, limit=None):
+    """
+    :param columns: 列名字符串 (例如 "col1, col2" 或 "*")。
+    """
+    query = f"SELECT {columns} FROM {table_name}"
+    if conditions:
+        query += f" WHERE {conditions}"
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    if limit is not None:
+        query += f" LIMIT {limit}"
+    return query
+
+
+@lru_cache(maxsize=1024)
+def update_sql(table_name, columns, conditions):
+    """
+    :param columns: 要更新的列名元组。
+    """
+    set_str = ", ".join(f"{key} = %s" for key in columns)
+    return f"UPDATE {table_name} SET {set_str} WHERE {conditions}"
+
+
+@lru_cache(maxsize=1024)
+def delete_sql(table_name, conditions):
+    return f"DELETE FROM {table_name} WHERE {conditions}"
+
+
+@lru_cache(maxsize=256)
+def named_row_class(columns):
+    """
+    按列名元组生成轻量行类型 (namedtuple，__slots__ 为空，按位置存储)，相同列集合复用同一个类。
+    非法标识符的列名 (如 COUNT(*)) 会被重命名为 _0、_1 等。
+    """
+    return namedtuple("Row", columns, rename=True)
+
+
+def _numpy_column(np, values):
+    if values and all(type(v) is int for v in values):
+        return np.array(values, dtype=np.int64)
+    if values and all(v is None or isinstance(v, (int, float, Decimal)) for v in values):
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    return values
+
+
+def format_rows(columns, rows, row_format):
+    """
+    将元组形式的结果行转换为指定格式。
+    :param columns: 列名元组。
+    :param rows: 元组行列表。
+    :param row_format: "tuple" 返回 (columns, rows)；"named" 返回具名行列表；
+                       "columnar" 返回 {列名: 值列表}；"numpy" 与 columnar 相同，但数值列为 NumPy 数组。
+    """
+    if row_format == "tuple":
+        return columns, rows
+    if row_format == "named":
+        row_class = named_row_class(tuple(columns))
+        return [row_class._make(row) for row in rows]
+    data = {col: list(values) for col, values in zip(columns, zip(*rows))} if rows else {
+        col: [] for col in columns
+    }
+    if row_format == "numpy":
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("row_format='numpy' 需要安装 numpy。") from e
+        data = {col: _numpy_column(np, values) for col, values in data.items()}
+    return data
+
+
+def format_row(columns, row, row_format):
+    """
+    单行版本的 format_rows："tuple" 返回 (columns, row)，"named" 返回具名行，
+    "columnar"/"numpy" 返回每列只有一个值的列式结果。
+    """
+    if row_format == "tuple":
+        return columns, row
+    if row_format == "named":
+        return named_row_class(tuple(columns))._make(row)
+    return format_rows(columns, [row], row_format)
+
+
+def _encode_key_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"$td": value.total_seconds()}
+    if isinstance(value, Decimal):
+        return {"$dec": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def _decode_key_value(value):
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+        if "$td" in value:
+            return timedelta(seconds=value["$td"])
+        if "$dec" in value:
+            return Decimal(value["$dec"])
+        if "$b" in value:
+            return base64.b64decode(value["$b"])
+    return value
+
+
+def encode_page_cursor(key_values):
+    """
+    将分页键值编码为可保存的游标字符串 (URL 安全)。
+    """
+    payload = json.dumps([_encode_key_value(v) for v in key_values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_page_cursor(token):
+    """
+    将 encode_page_cursor 生成的游标字符串还原为键值列表。
+    """
+    payload = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+    return [_decode_key_value(v) for v in json.loads(payload)]
+
+
+class _ConnectionLost(Exception):
+    """
+    内部信号：当前借用的连接已断开，应被丢弃。
+    """
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+BATCH_MODES = ("fetch_all", "fetch_one", "commit", "execute")
+BATCH_NOT_EXECUTED = "未执行"
+
+
+class BatchResults(list):
+    """
+    execute_batch 的返回值：按语句顺序排列的结果列表。
+    errors 与之一一对应：成功为 None，失败为错误信息，出错语句之后未执行的语句为 BATCH_NOT_EXECUTED。
+    """
+
+    def __init__(self, size):
+        super().__init__([None] * size)
+        self.errors = [None] * size
+
+    @property
+    def ok(self):
+        return not any(self.errors)
+
+
+def _close_cursor(cursor):
+    """
+    关闭游标，忽略连接已断开等情况下的关闭错误。
+    """
+    if cursor is None:
+        return
+    try:
+        cursor.close()
+    except Error:
+        pass
+
+
+class MySQLConnectionPool:
+    """
+    线程安全的 MySQL 连接池。
+    连接按需创建，归还后放回空闲队列复用；超过最大存活时间或空闲过久的连接会被回收重建。
+    """
+
+    def __init__(
+        self,
+        connect_kwargs,
+        pool_size=5,
+        timeout=30,
+        max_lifetime=3600,
+        idle_timeout=300,
+        ping_interval=30,
+    ):
+        """
+        :param connect_kwargs: 传给 mysql.connector.connect 的连接参数字典。
+        :param pool_size: 连接池最大连接数。
+        :param timeout: 借出连接的最长等待时间 (秒)，超时抛出 PoolError。
+        :param max_lifetime: 单个连接的最大存活时间 (秒)，超过后回收，None 表示不限制。
+        :param idle_timeout: 连接的最大空闲时间 (秒)，超过后回收，None 表示不限制。
+        :param ping_interval: 连接空闲超过该时间 (秒) 才在借出前检测存活，否则直接认为连接可用。
+        """
+        self.connect_kwargs = connect_kwargs
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._idle = deque()  # (conn, last_used)，右端为最近归还的连接
+        self._created = {}  # id(conn) -> 创建时间
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _expired(self, conn, now):
+        created = self._created.get(id(conn), now)
+        return bool(self.max_lifetime) and now - created > self.max_lifetime
+
+    def _release_slot(self, conn):
+        """
+        释放一个连接占用的名额 (调用方需持有锁)。
+        """
+        self._created.pop(id(conn), None)
+        self._size -= 1
+        self._cond.notify()
+
+    def _close_quietly(self, conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def get(self):
+        """
+        借出一个连接。池中无空闲连接且已达上限时等待，超时抛出 PoolError。
+        :return: MySQL 连接对象。
+        """
+        deadline = time.monotonic() + self.timeout
+        stale = []
+        conn = None
+        last_used = None
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("连接池已关闭。")
+                    now = time.monotonic()
+                    # 先回收队首 (最久未用) 的空闲超时连接
+                    while (
+                        self.idle_timeout
+                        and self._idle
+                        and now - self._idle[0][1] > self.idle_timeout
+                    ):
+                        old, _ = self._idle.popleft()
+                        self._release_slot(old)
+                        stale.append(old)
+                    while self._idle:
+                        candidate, used_at = self._idle.pop()
+                        if self._expired(candidate, now):
+                            self._release_slot(candidate)
+                            stale.append(candidate)
+                            continue
+                        conn, last_used = candidate, used_at
+                        break
+                    if conn is not None:
+                        break
+                    if self._size < self.pool_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(
+                            f"等待连接池连接超时 ({self.timeout}s，池大小 {self.pool_size})。"
+                        )
+                    self._cond.wait(remaining)
+        finally:
+            self._close_quietly(stale)
+
+        if conn is not None:
+            # 最近用过的连接直接认为可用，避免每次借出都多一次服务器往返
+            if time.monotonic() - last_used <= self.ping_interval or conn.is_connected():
+                return conn
+            with self._cond:
+                self._release_slot(conn)
+                self._size += 1
+
+        try:
+            conn = mysql.connector.connect(**self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def put(self, conn, discard=False):
+        """
+        归还连接。
+        :param conn: 之前通过 get() 借出的连接。
+        :param discard: 如果为 True，直接关闭该连接而不放回池中 (例如连接已损坏)。
+        """
+        if not discard and conn.in_transaction:
+            # 结束只读查询留下的隐式事务，否则下一个借用者会一直读到旧的一致性快照
+            try:
+                conn.rollback()
+            except Error:
+                discard = True
+        now = time.monotonic()
+        with self._cond:
+            if not (discard or self._closed or self._expired(conn, now)):
+                self._idle.append((conn, now))
+                self._cond.notify()
+                return
+            self._release_slot(conn)
+        self._close_quietly([conn])
+
+    def close(self):
+        """
+        关闭池中所有空闲连接，之后的 get() 会抛出 PoolError。
+        借出中的连接在归还时关闭。
+        """
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            for conn in idle:
+                self._release_slot(conn)
+            self._cond.notify_all()
+        self._close_quietly(idle)
+
+
+# LOAD DATA 默认格式 (FIELDS TERMINATED BY '\t' ESCAPED BY '\\' LINES TERMINATED BY '\n') 下需要转义的字节
+_INFILE_ESCAPES = {
+    ord("\\"): b"\\\\",
+    ord("\t"): b"\\t",
+    ord("\n"): b"\\n",
+    ord("\r"): b"\\r",
+    0: b"\\0",
+}
+# 服务器或客户端禁用 LOCAL INFILE 时的错误码
+LOCAL_INFILE_DISABLED_ERRNOS = {1148, 2068, 3948}
+
+
+def _escape_infile_bytes(data):
+    if not any(b in data for b in b"\\\t\n\r\x00"):
+        return data
+    return b"".join(_INFILE_ESCAPES.get(b, bytes((b,))) for b in data)
+
+
+def encode_infile_row(row):
+    """
+    将一行编码为 LOAD DATA 默认格式的一行 (制表符分隔，None 编码为 \\N)。
+    """
+    fields = []
+    for value in row:
+        if value is None:
+            fields.append(b"\\N")
+            continue
+        if isinstance(value, bool):
+            data = b"1" if value else b"0"
+        elif isinstance(value, (bytes, bytearray)):
+            data = bytes(value)
+        elif isinstance(value, datetime):
+            data = value.isoformat(sep=" ").encode("ascii")
+        else:
+            data = str(value).encode("utf-8")
+        fields.append(_escape_infile_bytes(data))
+    return b"\t".join(fields) + b"\n"
+
+
+class _FifoWriter(threading.Thread):
+    """
+    后台线程：把行编码后写入命名管道，供 LOAD DATA LOCAL INFILE 边读边导入，无需临时文件。
+    在读端真正打开之前被取消时不会消费任何行。
+    """
+
+    def __init__(self, path, rows):
+        super().__init__(name="load-data-writer", daemon=True)
+        self.path = path
+        self.rows = rows
+        self.lock = threading.Lock()
+        self.started_writing = False
+        self.cancelled = False
+        self.rows_written = 0
+        self.error = None
+
+    def run(self):
+        try:
+            with open(self.path, "wb", buffering=1024 * 1024) as pipe:
+                with self.lock:
+                    if self.cancelled:
+                        return
+                    self.started_writing = True
+                for row in self.rows:
+                    pipe.write(encode_infile_row(row))
+                    self.rows_written += 1
+        except Exception as e:
+            self.error = e
+
+    def cancel(self):
+        """
+        取消写入。
+        :return: 取消前是否已经开始消费行。
+        """
+        with self.lock:
+            self.cancelled = True
+            started = self.started_writing
+        if not started:
+            # 打开再关闭读端，唤醒阻塞在 open() 上的写线程
+            try:
+                fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+                os.close(fd)
+            except OSError:
+                pass
+        self.join()
+        return started
+
+
+class QueryCache:
+    """
+    查询结果缓存 (read-through)：按规范化后的 SQL + 参数缓存 select() 的结果，
+    LRU 限制条目数，支持按表设置 TTL；通过 MySQLManager 的写操作会自动使对应表的缓存失效。
+    注意：命中时返回的是缓存中的对象本身，调用方不应修改。
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, table_ttls=None):
+        """
+        :param maxsize: 最大缓存条目数，超过后淘汰最久未使用的条目。
+        :param ttl: 默认过期时间 (秒)，None 表示不过期。
+        :param table_ttls: 按表设置的过期时间字典，例如 {"config": 600}。
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.table_ttls = {self._table_key(t): v for t, v in (table_ttls or {}).items()}
+        self._entries = OrderedDict()  # key -> (table, expires_at, value)
+        self._tables = {}  # table -> set(key)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _table_key(table_name):
+        return table_name.strip("` ").lower()
+
+    @staticmethod
+    def make_key(query, params, *options):
+        """
+        生成缓存键：SQL 中的空白被规范化，参数转为元组。参数不可哈希时返回 None (不缓存)。
+        """
+        key = (" ".join(query.split()), tuple(params or ()), options)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _remove(self, key):
+        table, _, _ = self._entries.pop(key)
+        keys = self._tables.get(table)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tables[table]
+
+    def get(self, key):
+        """
+        :return: (是否命中, 缓存值)。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            _, expires_at, value = entry
+            if expires_at is not None and time.monotonic() > expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, table_name, key, value):
+        table = self._table_key(table_name)
+        ttl = self.table_ttls.get(table, self.ttl)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (table, expires_at, value)
+            self._tables.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, table_name):
+        """
+        删除某张表的全部缓存条目。
+        """
+        table = self._table_key(table_name)
+        with self._lock:
+            keys = self._tables.pop(table, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            if keys:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+
+    def stats(self):
+        """
+        :return: 命中、未命中、淘汰、过期、失效次数以及当前条目数和命中率。
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+
+class VersionCache:
+    """
+    MySQLManagerWithVersionControler 的进程内版本缓存：按 (表, 名称, 版本) 缓存内容行，
+    每个名称另有一个指向最新版本的 "latest" 指针；查询不到的结果也会被缓存 (负缓存)。
+    具体版本的内容不会变化，只受 LRU 淘汰；latest 指针和负缓存按各自的 TTL 过期，
+    通过同一个管理器的写操作会使对应表的缓存立即失效。
+    注意：命中时返回的是缓存中的对象本身，调用方不应修改。
+    """
+
+    def __init__(self, maxsize=4096, latest_ttl=60, negative_ttl=10):
+        """
+        :param maxsize: 最大缓存条目数 (包括 latest 指针)，超过后淘汰最久未使用的条目。
+        :param latest_ttl: latest 指针的过期时间 (秒)，None 表示不过期 (只有本进程写入，或启用了水位检测时)。
+        :param negative_ttl: 未命中结果的缓存时间 (秒)。
+        """
+        self.maxsize = maxsize
+        self.latest_ttl = latest_ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # (table, name, version 或 None) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at is not None and time.monotonic() > expires_at:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, table_name, name, version=None):
+        """
+        :param version: 版本号；为 None 时通过 latest 指针查找最新版本。
+        :return: (是否命中, 内容行或 None)。命中且值为 None 表示数据库中不存在 (负缓存)。
+        """
+        with self._lock:
+            if version is None:
+                hit, version = self._lookup((table_name, name, None))
+                if hit and version is None:
+                    self.hits += 1
+                    return True, None
+                if not hit:
+                    self.misses += 1
+                    return False, None
+            hit, row = self._lookup((table_name, name, version))
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return hit, row
+
+    def set(self, table_name, name, version, row):
+        """
+        缓存一次查询的结果。
+        :param version: 查询时指定的版本号；为 None 表示查询的是最新版本，同时更新 latest 指针。
+        :param row: 查询结果，None 表示不存在。
+        """
+        with self._lock:
+            if row is None:
+                self._store((table_name, name, version), None, self.negative_ttl)
+                return
+            if version is None:
+                self._store((table_name, name, None), row["version"], self.latest_ttl)
+            self._store((table_name, name, row["version"]), row, None)
+
+    def invalidate(self, table_name, name=None):
+        """
+        删除某张表 (或表中某个名称) 的全部缓存条目。
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == table_name and name in (None, k[1])]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
 class MySQLManager:
     """
     一个用于与 MySQL 数据库交互的通用工具包。
@@ -20,7 +758,21 @@ class MySQLManager:
                  host=None, 
                  user=None, 
                  password=None, 
-                 database=None, port=3306):
+                 database=None, port=3306,
+                 pool_size=None,
+                 pool_timeout=30,
+                 pool_max_lifetime=3600,
+                 pool_idle_timeout=300,
+                 ping_interval=30,
+                 query_cache=None,
+                 prepared_statements=0,
+                 replicas=None,
+                 read_strategy="round_robin",
+                 read_your_writes=0,
+                 replica_cooldown=30,
+                 instrumentation=None,
+                 column_codec=None,
+                 autocommit=False):
         """
         初始化数据库管理器。
         :param host: 数据库主机名或 IP 地址。
@@ -28,27 +780,107 @@ class MySQLManager:
         :param password: 数据库密码。
         :param database: 默认数据库名称 (可选，如果只连接到服务器而不指定数据库)。
         :param port: 数据库端口 (默认为 3306)。
+        :param pool_size: 连接池大小；为 None 时使用单连接模式，设置后每次操作从池中借出连接，可被多线程共享。
+        :param pool_timeout: 从连接池借出连接的最长等待时间 (秒)。
+        :param pool_max_lifetime: 池中连接的最大存活时间 (秒)，超过后重建。
+        :param pool_idle_timeout: 池中连接的最大空闲时间 (秒)，超过后回收。
+        :param ping_interval: 连接空闲超过该时间 (秒) 才检测存活；连接出错时会丢弃并重连，只读查询自动重试一次。
+        :param query_cache: 可选的 QueryCache 实例，启用后 select() 的结果会被缓存，
+                            insert/bulk_insert/update/delete 等写操作自动使对应表失效。
+        :param prepared_statements: 每个连接最多保留的服务器端预处理语句数 (LRU)；为 0 时不使用预处理语句。
+                                    启用后 insert/select/update/delete 的参数化语句在同一连接上只 prepare 一次。
+        :param replicas: 只读副本列表，每项为 {"host": ..., "port": ...} (可选 user/password/database，默认与主库相同)。
+                         配置后 select 以及 fetch_one/fetch_all 的只读查询分发到副本，写操作和事务始终走主库。
+        :param read_strategy: 副本选择策略，"round_robin" (轮询) 或 "least_latency" (最近平均延迟最低)。
+        :param read_your_writes: 当前线程写入后的这段时间 (秒) 内读请求仍走主库，保证读到自己的写入。
+        :param replica_cooldown: 副本连接断开后暂停使用的时间 (秒)，之后重新参与选择并重新测量延迟。
+        :param instrumentation: 可选的 db_help.mysql_metrics.QueryInstrumentation 实例，
+                                启用后 execute_query 的每次执行都会触发钩子并记录延迟直方图 (副本共享同一实例)。
+        :param column_codec: 可选的 db_help.mysql_codec.ColumnCodec 实例，启用后 insert/bulk_insert/
+                             bulk_insert_chunked/bulk_upsert/bulk_update/load_rows/update 写入前压缩指定列，
+                             select/select_iter (字典行)、select_pages、parallel_scan 和 export_table 读取后解压。
+        :param autocommit: 连接是否使用自动提交模式。只读副本始终启用，使每次读取都能看到最新提交的数据，
+                           而不是停留在第一次读取时的一致性快照；transaction() 不受影响。
         """
         self.host = host or os.getenv("MySQL_DB_HOST")
         self.user = user or os.getenv("MySQL_DB_USER")
         self.password = password or os.getenv("MySQL_DB_PASSWORD")
         self.database = database or os.getenv("MySQL_DB_NAME")
         self.port = port
+        self.autocommit = autocommit
         self.connection = None
+        self._local = threading.local()  # 当前线程的事务状态
+        self.query_cache = query_cache
+        self.instrumentation = instrumentation
+        self.column_codec = column_codec
+        self.prepared_statements = prepared_statements
+        self._statements = weakref.WeakKeyDictionary()  # conn -> OrderedDict[(sql, dictionary)] = (sql, cursor)
+        self._statements_lock = threading.Lock()
+        self._max_allowed_packet = None
+        self.ping_interval = ping_interval
+        self._last_used = 0.0
+        self.pool = None
+        if pool_size:
+            self.pool = MySQLConnectionPool(
+                self._connect_kwargs(),
+                pool_size=pool_size,
+                timeout=pool_timeout,
+                max_lifetime=pool_max_lifetime,
+                idle_timeout=pool_idle_timeout,
+                ping_interval=ping_interval,
+            )
+
+        if read_strategy not in ("round_robin", "least_latency"):
+            raise ValueError(f"不支持的 read_strategy: {read_strategy}")
+        self.read_strategy = read_strategy
+        self.read_your_writes = read_your_writes
+        self.replicas = [
+            MySQLManager(
+                host=replica["host"],
+                user=replica.get("user", self.user),
+                password=replica.get("password", self.password),
+                database=replica.get("database", self.database),
+                port=replica.get("port", 3306),
+                pool_size=pool_size,
+                pool_timeout=pool_timeout,
+                pool_max_lifetime=pool_max_lifetime,
+                pool_idle_timeout=pool_idle_timeout,
+                ping_interval=ping_interval,
+                prepared_statements=prepared_statements,
+                instrumentation=instrumentation,
+                autocommit=True,
+            )
+            for replica in replicas or ()
+        ]
+        self.replica_cooldown = replica_cooldown
+        self._replica_latency = [0.0] * len(self.replicas)  # 指数移动平均延迟 (秒)
+        self._replica_down_until = [0.0] * len(self.replicas)  # 出错副本恢复可用的时间 (monotonic)
+        self._replica_cursor = 0
+        self._replica_lock = threading.Lock()
+
+    def _connect_kwargs(self):
+        return dict(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            port=self.port,
+            autocommit=self.autocommit,
+        )
 
     def _connect(self):
         """
         建立数据库连接。
+        最近 ping_interval 秒内用过的连接直接复用，不再额外检测存活。
         """
+        if (
+            self.connection is not None
+            and time.monotonic() - self._last_used <= self.ping_interval
+        ):
+            return self.connection
         if self.connection is None or not self.connection.is_connected():
             try:
-                self.connection = mysql.connector.connect(
-                    host=self.host,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database,
-                    port=self.port,
-                )
+                self.connection = mysql.connector.connect(**self._connect_kwargs())
                 if self.connection.is_connected():
                     editing_logger(
                         f"成功连接到 MySQL 数据库: {self.database if self.database else self.host}"
@@ -60,17 +892,299 @@ class MySQLManager:
                 return None
         return self.connection
 
+    @contextmanager
+    def _borrow(self):
+        """
+        借用一个连接：连接池模式下从池中借出并在结束后归还，单连接模式下返回 self.connection。
+        获取失败时产出 None；with 块内抛出 _ConnectionLost 时丢弃该连接。
+        当前线程处于 transaction() 块内时，始终返回事务固定的连接。
+        """
+        tx = getattr(self._local, "tx", None)
+        if tx is not None:
+            yield tx["conn"]
+            return
+        if self.pool is None:
+            conn = self._connect()
+            try:
+                yield conn
+            except _ConnectionLost:
+                self._drop_connection()
+                raise
+            self._last_used = time.monotonic()
+            return
+        try:
+            conn = self.pool.get()
+        except Error as e:
+            logger.error(f"从连接池获取连接时发生错误: {e}")
+            conn = None
+        discard = False
+        try:
+            yield conn
+        except _ConnectionLost:
+            discard = True
+            raise
+        finally:
+            if conn is not None:
+                self.pool.put(conn, discard=discard)
+
+    def _drop_connection(self):
+        """
+        丢弃单连接模式下已断开的连接，下次使用时重连。
+        """
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Error:
+                pass
+            self.connection = None
+
+    @contextmanager
+    def _dedicated_connection(self):
+        """
+        独占一个连接用于长时间操作 (如流式读取)：连接池模式下从池中借出，单连接模式下新建临时连接，
+        不占用 self.connection。获取失败时产出 None；with 块异常退出 (包括生成器被提前关闭) 时丢弃该连接。
+        """
+        try:
+            if self.pool is not None:
+                conn = self.pool.get()
+            else:
+                conn = mysql.connector.connect(**self._connect_kwargs())
+        except Error as e:
+            logger.error(f"获取独占连接时发生错误: {e}")
+            yield None
+            return
+        completed = False
+        try:
+            yield conn
+            completed = True
+        finally:
+            if self.pool is not None:
+                self.pool.put(conn, discard=not completed)
+            else:
+                try:
+                    conn.close()
+                except Error:
+                    pass
+
+    def _invalidate(self, table_name):
+        """
+        写操作后使表的查询缓存失效；事务内同时记录该表，提交后再失效一次
+        (无论启用了哪种缓存都要记录，子类的缓存也依赖提交后的这次失效)。
+        """
+        tx = getattr(self._local, "tx", None)
+        if tx is not None:
+            tx["tables"].add(table_name)
+        if self.query_cache is None:
+            return
+        self.query_cache.invalidate(table_name)
+
+    def _in_transaction(self):
+        return getattr(self._local, "tx", None) is not None
+
+    def _refresh_snapshot(self):
+        """
+        单连接模式下结束读操作留下的隐式事务 (autocommit 关闭时 SELECT 也会开启事务)，
+        使下一次读取看到其他连接已提交的数据。连接池模式在归还连接时已处理；transaction() 块内不处理。
+        """
+        conn = self.connection
+        if self.pool is not None or self._in_transaction() or conn is None:
+            return
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except Error as e:
+                logger.warning(f"结束隐式事务时发生错误: {e}")
+
+    def _commit(self, conn):
+        """
+        提交事务；处于 transaction() 块内时跳过，由块结束时统一提交。
+        :return: 是否真正执行了提交。
+        """
+        if self._in_transaction():
+            return False
+        conn.commit()
+        self._local.last_write = time.monotonic()
+        return True
+
+    def _read_replica(self):
+        """
+        为只读查询选择副本：没有副本、处于事务中、在 read_your_writes 窗口内或所有副本都在出错冷却期内时
+        返回 None (走主库)。
+        :return: (副本序号, 副本 MySQLManager) 或 None。
+        """
+        if not self.replicas or self._in_transaction():
+            return None
+        if self.read_your_writes:
+            last_write = getattr(self._local, "last_write", None)
+            if last_write is not None and time.monotonic() - last_write < self.read_your_writes:
+                return None
+        now = time.monotonic()
+        with self._replica_lock:
+            available = [i for i, until in enumerate(self._replica_down_until) if until <= now]
+            if not available:
+                return None
+            if self.read_strategy == "least_latency":
+                index = min(available, key=self._replica_latency.__getitem__)
+            else:
+                index = available[self._replica_cursor % len(available)]
+                self._replica_cursor += 1
+        return index, self.replicas[index]
+
+    def _record_replica_latency(self, index, elapsed):
+        with self._replica_lock:
+            previous = self._replica_latency[index]
+            self._replica_latency[index] = elapsed if not previous else 0.8 * previous + 0.2 * elapsed
+
+    def _mark_replica_down(self, index):
+        """
+        副本连接断开：在 replica_cooldown 秒内不再选择它，并清空延迟估计，
+        冷却结束后按新的测量结果参与 least_latency 选择 (而不是被一次故障永久排除)。
+        """
+        with self._replica_lock:
+            self._replica_down_until[index] = time.monotonic() + self.replica_cooldown
+            self._replica_latency[index] = 0.0
+
+    @staticmethod
+    def _run(conn, statement):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            _close_cursor(cursor)
+
+    @contextmanager
+    def transaction(self):
+        """
+        显式事务 (工作单元)。块内当前线程的所有 CRUD 操作共用一个连接，
+        各操作自身的提交被跳过，块正常结束时统一提交一次，抛出异常时整体回滚。
+        嵌套使用时内层块对应一个 SAVEPOINT，内层异常只回滚到该保存点。
+        块内 SQL 出错时会直接抛出异常 (而不是返回 None)，以保证原子性。
+
+        用法:
+            with manager.transaction():
+                manager.insert("a", {...})
+                manager.update("b", {...}, "id = %s", (1,))
+        """
+        tx = getattr(self._local, "tx", None)
+        if tx is not None:
+            conn = tx["conn"]
+            tx["depth"] += 1
+            savepoint = f"db_help_sp_{tx['depth']}"
+            self._run(conn, f"SAVEPOINT {savepoint}")
+            try:
+                yield self
+            except BaseException:
+                try:
+                    self._run(conn, f"ROLLBACK TO SAVEPOINT {savepoint}")
+                except Error as e:
+                    # 死锁等错误会让 MySQL 回滚整个事务并丢弃保存点 (1305)，保留原始异常
+                    logger.error(f"回滚到保存点 {savepoint} 失败: {e}")
+                raise
+            else:
+                self._run(conn, f"RELEASE SAVEPOINT {savepoint}")
+            finally:
+                tx["depth"] -= 1
+            return
+
+        if self.pool is not None:
+            conn = self.pool.get()
+        else:
+            conn = self._connect()
+            if conn is None:
+                raise InterfaceError("无法获取数据库连接，事务未开始。")
+        try:
+            # 丢弃连接上残留的隐式事务 (及其旧快照)，再显式开始新事务
+            if conn.in_transaction:
+                conn.rollback()
+            conn.start_transaction()
+        except Error:
+            if self.pool is not None:
+                self.pool.put(conn, discard=True)
+            else:
+                self._drop_connection()
+            raise
+        self._local.tx = {"conn": conn, "depth": 0, "tables": set()}
+        discard = False
+        try:
+            yield self
+        except BaseException:
+            try:
+                conn.rollback()
+                editing_logger("事务已回滚。")
+            except Error as e:
+                logger.error(f"回滚事务时发生错误: {e}")
+                discard = True
+            raise
+        else:
+            try:
+                conn.commit()
+                self._local.last_write = time.monotonic()
+                editing_logger("事务已提交。")
+                # 提交后再次失效，避免事务期间其他线程读到旧数据并写回缓存
+                for table_name in self._local.tx["tables"]:
+                    self._invalidate(table_name)
+            except Error as e:
+                logger.error(f"提交事务时发生错误: {e}")
+                discard = True
+                try:
+                    conn.rollback()
+                except Error:
+                    pass
+                raise
+        finally:
+            self._local.tx = None
+            if self.pool is not None:
+                self.pool.put(conn, discard=discard)
+            elif discard:
+                self._drop_connection()
+            else:
+                self._last_used = time.monotonic()
+
+    def _prepared_cursor(self, conn, query, dictionary):
+        """
+        获取连接上缓存的预处理语句游标，不存在时新建并按 LRU 淘汰最久未用的语句。
+        :return: (sql, cursor)；执行时必须传入返回的 sql 对象本身，游标才会复用已 prepare 的语句。
+        """
+        with self._statements_lock:
+            statements = self._statements.get(conn)
+            if statements is None:
+                statements = self._statements[conn] = OrderedDict()
+        key = (query, dictionary)
+        entry = statements.get(key)
+        if entry is not None:
+            statements.move_to_end(key)
+            return entry
+        entry = (query, conn.cursor(prepared=True, dictionary=dictionary))
+        statements[key] = entry
+        while len(statements) > self.prepared_statements:
+            _, (_, evicted) = statements.popitem(last=False)
+            _close_cursor(evicted)
+        return entry
+
+    def _forget_prepared(self, conn, query, dictionary):
+        statements = self._statements.get(conn)
+        if statements is not None:
+            entry = statements.pop((query, dictionary), None)
+            if entry is not None:
+                _close_cursor(entry[1])
+
     def close(self):
         """
-        关闭数据库连接。
+        关闭数据库连接 (连接池模式下关闭整个连接池)。
         """
+        if self.pool is not None:
+            self.pool.close()
+            editing_logger("数据库连接池已关闭。")
         if self.connection and self.connection.is_connected():
             self.connection.close()
             editing_logger("数据库连接已关闭。")
             self.connection = None
+        for replica in self.replicas:
+            replica.close()
 
     def execute_query(
-        self, query, params=None, fetch_one=False, fetch_all=False, commit=False
+        self, query, params=None, fetch_one=False, fetch_all=False, commit=False,
+        row_format="dict", prepared=False,
     ):
         """
         执行 SQL 查询 (用于 SELECT, INSERT, UPDATE, DELETE, DDL)。
@@ -78,44 +1192,331 @@ class MySQLManager:
         :param params: 查询参数 (元组或列表)，用于参数化查询。
         :param fetch_one: 如果为 True，则获取单行结果 (用于 SELECT)。
         :param fetch_all: 如果为 True，则获取所有结果 (用于 SELECT)。
-        :param commit: 如果为 True，则提交事务 (用于 INSERT, UPDATE, DELETE, DDL)。
+        :param commit: 如果为 True，则提交事务 (用于 INSERT, UPDATE, DELETE, DDL)；
+                       在 transaction() 块内时跳过提交。
+        :param row_format: 结果行格式。"dict" (默认) 每行一个字典；"tuple" 返回 (列名元组, 元组行)；
+                           "named" 每行一个轻量具名元组；"columnar" 返回 {列名: 值列表}；
+                           "numpy" 同 columnar，但数值列为 NumPy 数组 (需安装 numpy)。
+        :param prepared: 如果为 True 且管理器启用了 prepared_statements，使用连接上缓存的服务器端预处理语句。
         :return: 查询结果 (如果是 SELECT)，或 None。
         """
-        conn = self._connect()
+        if row_format not in ROW_FORMATS:
+            raise ValueError(f"不支持的 row_format: {row_format}，可选 {ROW_FORMATS}")
+        read_only = is_read_only_query(query)
+        if not commit and (fetch_one or fetch_all) and read_only:
+            target = self._read_replica()
+            if target is not None:
+                index, replica = target
+                started = time.monotonic()
+                try:
+                    result = replica._execute(
+                        query, params, fetch_one, fetch_all, False, row_format, prepared
+                    )
+                    self._record_replica_latency(index, time.monotonic() - started)
+                    return result
+                except _ConnectionLost as e:
+                    # 副本不可用：冷却期内暂时避开，并改走主库
+                    self._mark_replica_down(index)
+                    logger.warning(f"只读副本 {replica.host} 连接已断开，改用主库: {e.error}")
+
+        retryable = not commit and read_only and not self._in_transaction()
+        try:
+            return self._execute(query, params, fetch_one, fetch_all, commit, row_format, prepared)
+        except _ConnectionLost as e:
+            if not retryable:
+                logger.error(f"执行查询时-连接已断开: {e.error}")
+                return None
+            logger.warning(f"连接已断开，重连后重试只读查询: {e.error}")
+        try:
+            return self._execute(query, params, fetch_one, fetch_all, commit, row_format, prepared)
+        except _ConnectionLost as e:
+            logger.error(f"执行查询时-连接已断开: {e.error}")
+            return None
+
+    def _execute(
+        self, query, params, fetch_one, fetch_all, commit, row_format="dict", prepared=False
+    ):
+        """
+        在借用的连接上执行一次查询；连接断开时抛出 _ConnectionLost，其余错误回滚并返回 None。
+        处于事务块内时出错直接抛出 Error，由 transaction() 负责回滚。
+        """
+        if self.instrumentation is not None:
+            return self._execute_instrumented(
+                query, params, fetch_one, fetch_all, commit, row_format, prepared
+            )
+        with self._borrow() as conn:
+            return self._execute_on(
+                conn, query, params, fetch_one, fetch_all, commit, row_format, prepared
+            )
+
+    def _execute_instrumented(
+        self, query, params, fetch_one, fetch_all, commit, row_format, prepared
+    ):
+        """
+        带埋点的 _execute：分别记录借出连接、执行和取回结果的耗时。
+        """
+        inst = self.instrumentation
+        event = inst.before(query, params)
+        timings = {}
+        error = None
+        start = time.perf_counter()
+        acquired = None
+        try:
+            with self._borrow() as conn:
+                acquired = time.perf_counter()
+                return self._execute_on(
+                    conn, query, params, fetch_one, fetch_all, commit, row_format, prepared, timings
+                )
+        except Exception as e:
+            error = getattr(e, "error", e)  # _ConnectionLost 携带原始错误
+            raise
+        finally:
+            end = time.perf_counter()
+            if acquired is None:
+                acquired = end
+            executed = timings.get("executed", end)
+            inst.after(
+                event,
+                timings.get("row_count", 0),
+                acquired - start,
+                executed - acquired,
+                end - executed,
+                error or timings.get("error"),
+            )
+
+    def _execute_on(
+        self, conn, query, params, fetch_one, fetch_all, commit, row_format="dict", prepared=False,
+        timings=None,
+    ):
+        """
+        在借用的连接上执行查询；timings 不为 None 时记录执行完成时间、行数和错误供埋点使用。
+        """
         if not conn:
             return None
 
         cursor = None
         result = None
+        dictionary = row_format == "dict"
+        use_prepared = bool(prepared and params and self.prepared_statements)
         try:
-            cursor = conn.cursor(
-                dictionary=True
-            )  # 使用 dictionary=True 返回字典形式的结果
+            # 默认使用 dictionary=True 返回字典形式的结果，其他格式用元组游标避免逐行构造字典
+            if use_prepared:
+                query, cursor = self._prepared_cursor(conn, query, dictionary)
+            else:
+                cursor = conn.cursor(dictionary=dictionary)
             cursor.execute(query, params)
+            if timings is not None:
+                timings["executed"] = time.perf_counter()
 
             if commit:
-                conn.commit()
-                editing_logger(f"Query committed. Affected rows: {cursor.rowcount}")
+                if self._commit(conn):
+                    editing_logger(f"Query committed. Affected rows: {cursor.rowcount}")
                 result = (
                     cursor.lastrowid
                     if query.strip().upper().startswith("INSERT")
                     else cursor.rowcount
                 )
+                if timings is not None:
+                    timings["row_count"] = cursor.rowcount
             elif fetch_one:
                 result = cursor.fetchone()
+                if use_prepared:
+                    cursor.fetchall()  # 预处理语句游标不缓冲，读完剩余行以便复用
+                if timings is not None:
+                    timings["row_count"] = int(result is not None)
+                if row_format != "dict" and result is not None:
+                    result = format_row(tuple(cursor.column_names), result, row_format)
             elif fetch_all:
                 result = cursor.fetchall()
+                if timings is not None:
+                    timings["row_count"] = len(result)
+                if row_format != "dict":
+                    result = format_rows(tuple(cursor.column_names), result, row_format)
 
         except Error as e:
+            if timings is not None:
+                timings["error"] = e
+            if use_prepared:
+                self._forget_prepared(conn, query, dictionary)
+            if self._in_transaction():
+                logger.error(f"事务中执行查询时-发生错误: {e}")
+                raise
+            if is_connection_error(e):
+                raise _ConnectionLost(e)
             logger.error(f"执行查询时-发生错误: {e}")
             if conn:
                 conn.rollback()  # 发生错误时回滚事务
             result = None
         finally:
-            if cursor:
-                cursor.close()
+            if not use_prepared:
+                _close_cursor(cursor)
         return result
 
+    def _iter_batches(self, query, params=None, batch_size=1000):
+        """
+        使用非缓冲游标执行查询，按 fetchmany 批次产出行列表。出错 (包括无法获取连接) 时抛出 Error。
+        """
+        with self._dedicated_connection() as conn:
+            if not conn:
+                raise InterfaceError("无法获取数据库连接")
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+
+    def execute_iter(self, query, params=None, batch_size=1000):
+        """
+        流式执行 SELECT 查询，逐行产出结果，内存占用与结果集大小无关。
+        使用独占连接上的非缓冲游标，每次从服务器读取 batch_size 行；
+        调用方提前停止迭代时连接会被丢弃而不是读完剩余结果。
+        读取中途出错 (例如连接断开) 时记录错误并抛出异常，以免调用方把截断的结果当作完整结果。
+        :param query: 要执行的 SQL 查询字符串。
+        :param params: 查询参数 (元组或列表)。
+        :param batch_size: 每次 fetchmany 读取的行数。
+        :return: 逐行产出字典的生成器。
+        """
+        target = self._read_replica() if is_read_only_query(query) else None
+        source = target[1] if target is not None else self
+        try:
+            for rows in source._iter_batches(query, params, batch_size):
+                yield from rows
+        except Error as e:
+            logger.error(f"流式查询时发生错误: {e}")
+            raise
+
+    def execute_batch(self, statements, row_format="dict"):
+        """
+        把多条互相独立的小查询拼成一条多语句查询，在同一个连接上一次往返执行，按每条语句的模式返回结果。
+        :param statements: [(sql, params, mode), ...]；params 可省略或为 None，必须是元组或列表；
+                           mode 为 "fetch_all" (默认)、"fetch_one"、"commit" 或 "execute"。
+                           不支持返回多个结果集的 CALL 语句。
+        :param row_format: 查询结果的行格式，见 execute_query。
+        :return: BatchResults 列表：fetch_all 为行列表，fetch_one 为单行或 None，commit/execute 为 lastrowid
+                 (INSERT) 或影响行数。某条语句出错时服务器不再执行其后的语句，本批次的写入全部回滚，
+                 出错和未执行的语句结果为 None，错误信息见 results.errors。
+                 包含 commit 语句且全部成功时最后提交一次；在 transaction() 块内不提交，出错时抛出 Error。
+        """
+        if row_format not in ROW_FORMATS:
+            raise ValueError(f"不支持的 row_format: {row_format}，可选 {ROW_FORMATS}")
+        parsed = []
+        flat_params = []
+        for statement in statements:
+            if isinstance(statement, str):
+                statement = (statement,)
+            sql, params, mode = (*statement, None, None)[:3]
+            mode = mode or "fetch_all"
+            if mode not in BATCH_MODES:
+                raise ValueError(f"不支持的 mode: {mode}，可选 {BATCH_MODES}")
+            if isinstance(params, dict):
+                raise ValueError("execute_batch 的参数必须是元组或列表。")
+            parsed.append((sql.strip().rstrip(";"), mode))
+            flat_params.extend(params or ())
+        if not parsed:
+            return BatchResults(0)
+        query = ";\n".join(sql for sql, _ in parsed)
+        params = tuple(flat_params) or None
+
+        read_only = all(
+            mode in ("fetch_all", "fetch_one") and is_read_only_query(sql) for sql, mode in parsed
+        )
+        if read_only:
+            target = self._read_replica()
+            if target is not None:
+                index, replica = target
+                started = time.monotonic()
+                try:
+                    results = replica._execute_batch(query, params, parsed, row_format)
+                    self._record_replica_latency(index, time.monotonic() - started)
+                    return results
+                except _ConnectionLost as e:
+                    self._mark_replica_down(index)
+                    logger.warning(f"只读副本 {replica.host} 连接已断开，改用主库: {e.error}")
+
+        attempts = 2 if read_only and not self._in_transaction() else 1
+        for attempt in range(attempts):
+            try:
+                results = self._execute_batch(query, params, parsed, row_format)
+            except _ConnectionLost as e:
+                error = e.error
+                if attempt + 1 < attempts:
+                    logger.warning(f"连接已断开，重连后重试只读批量查询: {error}")
+            else:
+                if not read_only:
+                    self._invalidate_written(parsed)
+                return results
+        logger.error(f"批量执行时-连接已断开: {error}")
+        results = BatchResults(len(parsed))
+        results.errors[:] = [str(error)] * len(parsed)
+        return results
+
+    def _invalidate_written(self, parsed):
+        """
+        批量执行提交后使被写入的表失效；存在无法解析表名的写语句时清空整个查询缓存。
+        """
+        for sql, _ in parsed:
+            if is_read_only_query(sql):
+                continue
+            table_name = written_table(sql)
+            if table_name is not None:
+                self._invalidate(table_name)
+            elif self.query_cache is not None:
+                self.query_cache.clear()
+
+    def _execute_batch(self, query, params, parsed, row_format):
+        """
+        在借用的连接上执行拼接后的多语句查询，用 nextset() 依次读取每条语句的结果。
+        连接断开时抛出 _ConnectionLost。
+        """
+        results = BatchResults(len(parsed))
+        with self._borrow() as conn:
+            if not conn:
+                results.errors[:] = ["无法获取数据库连接"] * len(parsed)
+                return results
+            cursor = None
+            index = 0
+            try:
+                cursor = conn.cursor(dictionary=row_format == "dict")
+                cursor.execute(query, params)
+                for index, (sql, mode) in enumerate(parsed):
+                    if index and not cursor.nextset():
+                        break
+                    results[index] = self._batch_result(cursor, sql, mode, row_format)
+                if any(mode == "commit" for _, mode in parsed) and self._commit(conn):
+                    editing_logger(f"批量执行 {len(parsed)} 条语句已提交。")
+            except Error as e:
+                if self._in_transaction():
+                    logger.error(f"事务中批量执行第 {index + 1} 条语句时发生错误: {e}")
+                    raise
+                if is_connection_error(e):
+                    raise _ConnectionLost(e)
+                logger.error(f"批量执行第 {index + 1} 条语句时发生错误: {e}")
+                conn.rollback()
+                results[index] = None
+                results.errors[index] = str(e)
+                for later in range(index + 1, len(parsed)):
+                    results.errors[later] = BATCH_NOT_EXECUTED
+            finally:
+                _close_cursor(cursor)
+        return results
+
+    @staticmethod
+    def _batch_result(cursor, sql, mode, row_format):
+        rows = cursor.fetchall() if cursor.with_rows else None
+        if mode == "fetch_all":
+            if rows is not None and row_format != "dict":
+                rows = format_rows(tuple(cursor.column_names), rows, row_format)
+            return rows
+        if mode == "fetch_one":
+            row = rows[0] if rows else None
+            if row is not None and row_format != "dict":
+                row = format_row(tuple(cursor.column_names), row, row_format)
+            return row
+        return cursor.lastrowid if sql.upper().startswith("INSERT") else cursor.rowcount
+
     # --- CRUD 操作封装 ---
 
     def create_database(self, db_name):
@@ -181,52 +1582,593 @@ class MySQLManager:
         if not data:
             logger.warning("错误：插入数据为空。")
             return None
+        if self.column_codec is not None:
+            data = self.column_codec.encode_row(table_name, data)
 
-        columns = ", ".join(data.keys())
-        placeholders = ", ".join(["%s"] * len(data))
-        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        query = insert_sql(table_name, tuple(data))
         params = tuple(data.values())
 
-        last_row_id = self.execute_query(query, params=params, commit=True)
+        last_row_id = self.execute_query(query, params=params, commit=True, prepared=True)
+        self._invalidate(table_name)
         if last_row_id is not None:
             editing_logger(f"数据已成功插入到 '{table_name}'，ID: {last_row_id}")
         return last_row_id
 
     def bulk_insert(self, table_name, columns, data_list):
         """
-        批量插入数据。
+        批量插入数据。
+        :param table_name: 表名。
+        :param columns: 列名列表，例如 ['name', 'age', 'email']。
+        :param data_list: 包含元组或列表的列表，每个元组/列表代表一行数据。
+                          例如: [('Alice', 30, 'alice@example.com'), ('Bob', 25, 'bob@example.com')]
+        :return: 影响的行数，或 None。
+        """
+        if not data_list:
+            logger.warning("错误：批量插入数据为空。")
+            return None
+        if self.column_codec is not None:
+            data_list = list(self.column_codec.encode_rows(table_name, columns, data_list))
+
+        query = insert_sql(table_name, tuple(columns))
+
+        try:
+            with self._borrow() as conn:
+                if not conn:
+                    return None
+
+                cursor = None
+                try:
+                    cursor = conn.cursor()
+                    cursor.executemany(query, data_list)
+                    self._commit(conn)
+                    self._invalidate(table_name)
+                    editing_logger(f"批量插入 {cursor.rowcount} 条数据到 '{table_name}'。")
+                    return cursor.rowcount
+                except Error as e:
+                    if self._in_transaction():
+                        logger.error(f"事务中批量插入数据时发生错误: {e}")
+                        raise
+                    if is_connection_error(e):
+                        raise _ConnectionLost(e)
+                    editing_logger(f"批量插入数据时发生错误: {e}")
+                    conn.rollback()
+                    return None
+                finally:
+                    _close_cursor(cursor)
+        except _ConnectionLost as e:
+            logger.error(f"批量插入数据时连接已断开: {e.error}")
+            return None
+
+    def max_allowed_packet(self):
+        """
+        获取服务器的 max_allowed_packet (字节)，结果会被缓存。
+        :return: 字节数，查询失败时返回默认值 4MB。
+        """
+        if self._max_allowed_packet is None:
+            row = self.execute_query(
+                "SELECT @@max_allowed_packet AS max_allowed_packet", fetch_one=True
+            )
+            if not row:
+                return 4 * 1024 * 1024
+            self._max_allowed_packet = int(row["max_allowed_packet"])
+        return self._max_allowed_packet
+
+    def _execute_chunked(self, table_name, statements, commit_every=1, on_chunk=None):
+        """
+        在同一个连接上依次执行分块语句，每 commit_every 块提交一次。
+        某块失败时回滚尚未提交的块并停止，已提交的块保留。
+        在 transaction() 块内时不单独提交，出错直接抛出异常。
+        :param statements: 产出 (query, params, row_count) 的可迭代对象，每项为一个块。
+        :return: 汇总字典，见 bulk_insert_chunked。
+        """
+        report = {
+            "rows": 0,
+            "chunks": 0,
+            "affected_rows": 0,
+            "elapsed": 0.0,
+            "rows_per_sec": 0.0,
+            "failed_chunk": None,
+            "resume_from_chunk": None,
+            "error": None,
+        }
+        started = time.monotonic()
+        pending_rows = pending_chunks = pending_affected = 0
+        index = -1
+        try:
+            with self._borrow() as conn:
+                if not conn:
+                    report["error"] = "无法获取数据库连接"
+                    return report
+                cursor = None
+                try:
+                    cursor = conn.cursor()
+                    for index, (query, params, row_count) in enumerate(statements):
+                        chunk_started = time.monotonic()
+                        cursor.execute(query, params)
+                        pending_rows += row_count
+                        pending_chunks += 1
+                        pending_affected += max(cursor.rowcount, 0)
+                        if pending_chunks >= commit_every:
+                            self._commit(conn)
+                            self._invalidate(table_name)
+                            report["rows"] += pending_rows
+                            report["chunks"] += pending_chunks
+                            report["affected_rows"] += pending_affected
+                            pending_rows = pending_chunks = pending_affected = 0
+                        if on_chunk is not None:
+                            elapsed = time.monotonic() - chunk_started
+                            on_chunk({
+                                "chunk": index,
+                                "rows": row_count,
+                                "committed_rows": report["rows"],
+                                "elapsed": elapsed,
+                                "rows_per_sec": row_count / elapsed if elapsed else 0.0,
+                            })
+                    if pending_chunks:
+                        self._commit(conn)
+                        self._invalidate(table_name)
+                        report["rows"] += pending_rows
+                        report["chunks"] += pending_chunks
+                        report["affected_rows"] += pending_affected
+                except Error as e:
+                    report["failed_chunk"] = max(index, 0)
+                    report["resume_from_chunk"] = report["chunks"]
+                    report["error"] = str(e)
+                    logger.error(
+                        f"分块写入 '{table_name}' 时第 {report['failed_chunk']} 块失败，"
+                        f"已提交 {report['rows']} 行: {e}"
+                    )
+                    if self._in_transaction():
+                        raise
+                    if is_connection_error(e):
+                        raise _ConnectionLost(e)
+                    conn.rollback()
+                finally:
+                    _close_cursor(cursor)
+        except _ConnectionLost:
+            pass
+
+        report["elapsed"] = time.monotonic() - started
+        if report["elapsed"]:
+            report["rows_per_sec"] = report["rows"] / report["elapsed"]
+        editing_logger(
+            f"分块写入 {report['rows']} 条数据到 '{table_name}'，共 {report['chunks']} 块，"
+            f"{report['rows_per_sec']:.0f} 行/秒。"
+        )
+        return report
+
+    def bulk_insert_chunked(
+        self,
+        table_name,
+        columns,
+        data_list,
+        commit_every=1,
+        max_rows=5000,
+        max_bytes=None,
+        on_chunk=None,
+    ):
+        """
+        分块批量插入数据，适合百万行级别的导入。
+        每个块是一条多行 INSERT ... VALUES (...),(...) 语句，大小按服务器 max_allowed_packet 切分。
+        某个块失败时只回滚尚未提交的块，已提交的块保留，并在返回结果中报告失败位置。
+        :param table_name: 表名。
+        :param columns: 列名列表，例如 ['name', 'age', 'email']。
+        :param data_list: 任意可迭代的行 (元组或列表)，可以是生成器。
+        :param commit_every: 每插入多少个块提交一次。
+        :param max_rows: 每个块的最大行数。
+        :param max_bytes: 每条语句的最大字节数，默认取 max_allowed_packet 的 80%。
+        :param on_chunk: 每个块插入后调用的回调，参数为该块的进度字典。
+        :return: 汇总字典，包含 rows (已提交行数)、chunks (已提交块数)、affected_rows、elapsed、rows_per_sec、
+                 failed_chunk (失败块序号或 None)、resume_from_chunk (第一个未提交的块序号) 和 error。
+        """
+        if max_bytes is None:
+            max_bytes = int(self.max_allowed_packet() * 0.8)
+        if self.column_codec is not None:
+            data_list = self.column_codec.encode_rows(table_name, columns, data_list)
+        statements = self._multi_row_insert_statements(
+            table_name, columns, data_list, max_rows, max_bytes
+        )
+        return self._execute_chunked(table_name, statements, commit_every, on_chunk)
+
+    def _multi_row_insert_statements(
+        self, table_name, columns, data_list, max_rows, max_bytes, suffix=""
+    ):
+        """
+        将行切分为多行 INSERT 语句，产出 (query, params, row_count)。
+        """
+        cols_str = ", ".join(columns)
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        prefix = f"INSERT INTO {table_name} ({cols_str}) VALUES "
+        for chunk in chunk_rows(data_list, max_bytes, max_rows):
+            query = prefix + ", ".join([row_placeholder] * len(chunk)) + suffix
+            yield query, [value for row in chunk for value in row], len(chunk)
+
+    def bulk_upsert(
+        self,
+        table_name,
+        columns,
+        data_list,
+        update_columns=None,
+        max_rows=2000,
+        max_bytes=None,
+        on_chunk=None,
+    ):
+        """
+        批量插入或更新 (INSERT ... ON DUPLICATE KEY UPDATE)。
+        按主键或唯一索引判断冲突，冲突的行更新 update_columns。每个块在一个事务中执行。
+        :param table_name: 表名。
+        :param columns: 列名列表。
+        :param data_list: 任意可迭代的行 (元组或列表)。
+        :param update_columns: 冲突时要更新的列名列表，默认为全部 columns。
+        :param max_rows: 每个块的最大行数。
+        :param max_bytes: 每条语句的最大字节数，默认取 max_allowed_packet 的 80%。
+        :param on_chunk: 每个块执行后调用的回调。
+        :return: 汇总字典，见 bulk_insert_chunked；affected_rows 中插入计 1、更新计 2。
+        """
+        update_columns = update_columns or columns
+        if max_bytes is None:
+            max_bytes = int(self.max_allowed_packet() * 0.8)
+        suffix = " ON DUPLICATE KEY UPDATE " + ", ".join(
+            f"{col} = VALUES({col})" for col in update_columns
+        )
+        if self.column_codec is not None:
+            data_list = self.column_codec.encode_rows(table_name, columns, data_list)
+        statements = self._multi_row_insert_statements(
+            table_name, columns, data_list, max_rows, max_bytes, suffix=suffix
+        )
+        return self._execute_chunked(table_name, statements, 1, on_chunk)
+
+    def bulk_update(
+        self,
+        table_name,
+        key_column,
+        data_list,
+        max_rows=500,
+        max_bytes=None,
+        on_chunk=None,
+    ):
+        """
+        批量按主键更新多行，每个块合并为一条 UPDATE ... SET col = CASE key WHEN ... END 语句，
+        每个块在一个事务中执行。
+        :param table_name: 表名。
+        :param key_column: 用于定位行的键列 (通常为主键)。
+        :param data_list: 字典列表，每个字典必须包含 key_column，其余键为要更新的列。
+                          例如: [{'id': 1, 'age': 31}, {'id': 2, 'age': 26, 'name': 'Bob'}]
+        :param max_rows: 每个块的最大行数 (CASE 分支过多会降低服务器效率)。
+        :param max_bytes: 每条语句的最大字节数，默认取 max_allowed_packet 的 40% (键值在语句中出现两次)。
+        :param on_chunk: 每个块执行后调用的回调。
+        :return: 汇总字典，见 bulk_insert_chunked。
+        """
+        if max_bytes is None:
+            max_bytes = int(self.max_allowed_packet() * 0.4)
+        if self.column_codec is not None:
+            data_list = (self.column_codec.encode_row(table_name, row) for row in data_list)
+        statements = self._case_update_statements(
+            table_name, key_column, data_list, max_rows, max_bytes
+        )
+        return self._execute_chunked(table_name, statements, 1, on_chunk)
+
+    def _case_update_statements(self, table_name, key_column, data_list, max_rows, max_bytes):
+        """
+        将字典行切分为 CASE 批量 UPDATE 语句，产出 (query, params, row_count)。
+        """
+        for chunk in chunk_rows(data_list, max_bytes, max_rows):
+            columns = []
+            for row in chunk:
+                for col in row:
+                    if col != key_column and col not in columns:
+                        columns.append(col)
+            if not columns:
+                continue
+            set_clauses = []
+            params = []
+            for col in columns:
+                branches = []
+                for row in chunk:
+                    if col in row:
+                        branches.append("WHEN %s THEN %s")
+                        params.extend((row[key_column], row[col]))
+                set_clauses.append(
+                    f"{col} = CASE {key_column} {' '.join(branches)} ELSE {col} END"
+                )
+            keys = [row[key_column] for row in chunk]
+            params.extend(keys)
+            query = (
+                f"UPDATE {table_name} SET {', '.join(set_clauses)} "
+                f"WHERE {key_column} IN ({', '.join(['%s'] * len(keys))})"
+            )
+            yield query, params, len(chunk)
+
+    def _local_infile_enabled(self):
+        """
+        检查主库是否允许 LOAD DATA LOCAL INFILE (不走只读副本，LOAD DATA 总是在主库上执行)。
+        """
+        try:
+            row = self._execute(
+                "SELECT @@local_infile AS local_infile", None, True, False, False, "dict", False
+            )
+        except _ConnectionLost as e:
+            logger.error(f"检查 local_infile 时连接已断开: {e.error}")
+            return False
+        return bool(row and int(row["local_infile"]))
+
+    def _load_data(self, statement, params, writer=None):
+        """
+        在开启 allow_local_infile 的临时连接上执行 LOAD DATA LOCAL INFILE 并提交。
+        :return: (导入行数, 错误)；成功时错误为 None。
+        """
+        try:
+            conn = mysql.connector.connect(**self._connect_kwargs(), allow_local_infile=True)
+        except Error as e:
+            return None, e
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(statement, params)
+            rows = cursor.rowcount
+            if writer is not None:
+                writer.join()
+                if writer.error is not None:
+                    conn.rollback()
+                    return None, writer.error
+            conn.commit()
+            return rows, None
+        except Error as e:
+            try:
+                conn.rollback()
+            except Error:
+                pass
+            return None, e
+        finally:
+            _close_cursor(cursor)
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def load_rows(self, table_name, columns, rows, fallback=True, **fallback_kwargs):
+        """
+        使用 LOAD DATA LOCAL INFILE 高速导入任意可迭代的行，适合千万行级别的导入。
+        行在后台线程中即时编码并写入命名管道，由驱动边读边发送，不会先生成完整的临时文件。
+        服务器或客户端禁用 local_infile (或系统不支持命名管道) 时，回退为 bulk_insert_chunked。
+        :param table_name: 表名。
+        :param columns: 列名列表，与每行的值一一对应。
+        :param rows: 任意可迭代的行 (元组或列表)，可以是生成器。
+        :param fallback: 无法使用 LOAD DATA 时是否回退为分块多行 INSERT。
+        :param fallback_kwargs: 回退时传给 bulk_insert_chunked 的参数。
+        :return: 汇总字典，包含 rows、elapsed、rows_per_sec、method ("load_data" 或 "insert") 和 error。
+        """
+        started = time.monotonic()
+        if not hasattr(os, "mkfifo") or not self._local_infile_enabled():
+            return self._load_fallback(table_name, columns, rows, fallback, fallback_kwargs)
+
+        statement = (
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} "
+            f"CHARACTER SET utf8mb4 ({', '.join(columns)})"
+        )
+        workdir = tempfile.mkdtemp(prefix="db_help_load_")
+        path = os.path.join(workdir, "rows.tsv")
+        os.mkfifo(path)
+        encoded = rows
+        if self.column_codec is not None:
+            # 回退时 bulk_insert_chunked 会自行压缩，只对写入管道的行编码
+            encoded = self.column_codec.encode_rows(table_name, columns, rows)
+        writer = _FifoWriter(path, encoded)
+        writer.start()
+        try:
+            loaded, error = self._load_data(statement, (path,), writer)
+            if error is not None and writer.is_alive():
+                consumed = writer.cancel()
+                if (
+                    not consumed
+                    and getattr(error, "errno", None) in LOCAL_INFILE_DISABLED_ERRNOS
+                ):
+                    logger.warning(f"LOAD DATA LOCAL INFILE 不可用，回退为分块插入: {error}")
+                    return self._load_fallback(table_name, columns, rows, fallback, fallback_kwargs)
+            writer.join()
+        finally:
+            os.unlink(path)
+            os.rmdir(workdir)
+        return self._load_report(table_name, loaded, error, started)
+
+    def load_file(
+        self,
+        table_name,
+        path,
+        columns=None,
+        delimiter=",",
+        quotechar='"',
+        header=True,
+        fallback=True,
+        **fallback_kwargs,
+    ):
+        """
+        使用 LOAD DATA LOCAL INFILE 导入 CSV/TSV 文件，字段中的 \\N 表示 NULL。
+        服务器或客户端禁用 local_infile 时，回退为逐行解析文件并分块 INSERT (流式读取，不整体载入内存)。
+        :param table_name: 表名。
+        :param path: 文件路径。
+        :param columns: 文件各列对应的列名列表；为 None 时使用表头 (header=True) 或表的全部列。
+        :param delimiter: 字段分隔符，TSV 文件使用 "\\t"。
+        :param quotechar: 字段引号字符。
+        :param header: 文件首行是否为表头。
+        :param fallback: 无法使用 LOAD DATA 时是否回退为分块多行 INSERT。
+        :return: 汇总字典，见 load_rows。
+        """
+        started = time.monotonic()
+        if columns is None and header:
+            with open(path, newline="", encoding="utf-8") as f:
+                columns = next(csv.reader(f, delimiter=delimiter, quotechar=quotechar), None)
+
+        if self._local_infile_enabled():
+            statement = (
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY %s OPTIONALLY ENCLOSED BY %s LINES TERMINATED BY '\\n'"
+            )
+            if header:
+                statement += " IGNORE 1 LINES"
+            if columns:
+                statement += f" ({', '.join(columns)})"
+            loaded, error = self._load_data(statement, (os.path.abspath(path), delimiter, quotechar))
+            if error is None or getattr(error, "errno", None) not in LOCAL_INFILE_DISABLED_ERRNOS:
+                return self._load_report(table_name, loaded, error, started)
+            logger.warning(f"LOAD DATA LOCAL INFILE 不可用，回退为分块插入: {error}")
+
+        if columns is None:
+            result = self.execute_query(
+                f"SELECT * FROM {table_name} LIMIT 0", fetch_all=True, row_format="tuple"
+            )
+            columns = list(result[0]) if result else []
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar)
+            if header:
+                next(reader, None)
+            rows = ([None if v == "\\N" else v for v in row] for row in reader)
+            return self._load_fallback(table_name, columns, rows, fallback, fallback_kwargs)
+
+    def _load_fallback(self, table_name, columns, rows, fallback, fallback_kwargs):
+        if not fallback:
+            error = "LOAD DATA LOCAL INFILE 不可用"
+            logger.error(f"导入 '{table_name}' 失败: {error}")
+            return {"rows": 0, "elapsed": 0.0, "rows_per_sec": 0.0, "method": "load_data", "error": error}
+        report = self.bulk_insert_chunked(table_name, columns, rows, **fallback_kwargs)
+        report["method"] = "insert"
+        return report
+
+    def _load_report(self, table_name, loaded, error, started):
+        self._invalidate(table_name)  # LOAD DATA 已提交，在此之后失效，避免并发读取把旧数据写回缓存
+        elapsed = time.monotonic() - started
+        report = {
+            "rows": loaded or 0,
+            "elapsed": elapsed,
+            "rows_per_sec": (loaded or 0) / elapsed if elapsed else 0.0,
+            "method": "load_data",
+            "error": None if error is None else str(error),
+        }
+        if error is not None:
+            logger.error(f"LOAD DATA 导入 '{table_name}' 时发生错误: {error}")
+        else:
+            editing_logger(
+                f"LOAD DATA 导入 {report['rows']} 条数据到 '{table_name}'，"
+                f"{report['rows_per_sec']:.0f} 行/秒。"
+            )
+        return report
+
+    def export_table(
+        self,
+        table_name,
+        path,
+        format="csv",
+        compression=None,
+        columns="*",
+        conditions=None,
+        params=None,
+        order_by=None,
+        batch_size=5000,
+    ):
+        """
+        流式导出表数据到文件：在独占连接上使用非缓冲游标按批读取，逐批写入文件，内存占用与表大小无关。
+        CSV 首行为表头，NULL 写为 \\N；日期时间和 Decimal 写为字符串。二进制类型的列 (按表结构判断) 在 CSV 中
+        写为 base64 并在表头中标记，NDJSON 中写为 {"$base64": ...}，parquet 中写为 binary，import_table 会还原为字节。
         :param table_name: 表名。
-        :param columns: 列名列表，例如 ['name', 'age', 'email']。
-        :param data_list: 包含元组或列表的列表，每个元组/列表代表一行数据。
-                          例如: [('Alice', 30, 'alice@example.com'), ('Bob', 25, 'bob@example.com')]
-        :return: 影响的行数，或 None。
+        :param path: 输出文件路径。
+        :param format: "csv"、"ndjson" 或 "parquet" (需安装 pyarrow)。
+        :param compression: None、"gzip" 或 "zstd" (需安装 zstandard)；parquet 使用对应的列块压缩编码。
+        :param columns: 要导出的列，字符串或列表，默认为全部列。
+        :param conditions: WHERE 子句的条件字符串。
+        :param params: 条件对应的参数。
+        :param order_by: ORDER BY 子句字符串。
+        :param batch_size: 每次从服务器读取并写入文件的行数。
+        :return: 汇总字典: rows、bytes (文件大小)、elapsed、rows_per_sec、path、error。
         """
-        if not data_list:
-            logger.warning("错误：批量插入数据为空。")
-            return None
+        check_export_options(format, compression)
+        if isinstance(columns, list):
+            columns = ", ".join(columns)
+        query = select_sql(table_name, columns, conditions, order_by, None)
+        target = self._read_replica()
+        source = target[1] if target is not None else self
+        binary_columns = self._binary_columns(table_name)
 
-        cols_str = ", ".join(columns)
-        placeholders = ", ".join(["%s"] * len(columns))
-        query = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders})"
+        started = time.monotonic()
+        rows = 0
+        error = None
+        writer = open_export_writer(path, format, compression, binary_columns)
+        try:
+            for batch in source._iter_batches(query, params, batch_size):
+                if self.column_codec is not None:
+                    self.column_codec.decode_rows(table_name, batch)
+                writer.write(batch)
+                rows += len(batch)
+        except Error as e:
+            error = e
+        finally:
+            writer.close()
 
-        conn = self._connect()
-        if not conn:
-            return None
+        elapsed = time.monotonic() - started
+        report = {
+            "rows": rows,
+            "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+            "elapsed": elapsed,
+            "rows_per_sec": rows / elapsed if elapsed else 0.0,
+            "path": path,
+            "error": None if error is None else str(error),
+        }
+        if error is not None:
+            logger.error(f"导出 '{table_name}' 时发生错误 (已写入 {rows} 行): {error}")
+        else:
+            editing_logger(
+                f"导出 '{table_name}' {rows} 行到 {path}，{report['bytes']} 字节，"
+                f"{report['rows_per_sec']:.0f} 行/秒。"
+            )
+        return report
 
-        cursor = None
+    def _binary_columns(self, table_name):
+        """
+        :return: 表中二进制类型 (BINARY/VARBINARY/BLOB) 的列名集合，查询失败时为空集合。
+        """
+        rows = self.execute_query(
+            """
+            SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+              AND DATA_TYPE IN ('binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob')
+            """,
+            params=(table_name,),
+            fetch_all=True,
+        )
+        return {row["name"] for row in rows or ()}
+
+    def import_table(
+        self,
+        table_name,
+        path,
+        format="csv",
+        compression=None,
+        columns=None,
+        **chunk_kwargs,
+    ):
+        """
+        流式导入 export_table 写出的文件：逐行读取并通过 bulk_insert_chunked 分块多行 INSERT，内存占用恒定。
+        导出时标记的二进制列按字节写入 (配置了 column_codec 时重新压缩)。
+        :param table_name: 表名。
+        :param path: 文件路径。
+        :param format: "csv"、"ndjson" 或 "parquet"。
+        :param compression: 与导出时相同的压缩方式。
+        :param columns: 目标列名列表；为 None 时使用文件中的列名 (CSV 表头、NDJSON 首行的键或 parquet 的 schema)。
+        :param chunk_kwargs: 传给 bulk_insert_chunked 的参数，例如 commit_every、max_rows。
+        :return: bulk_insert_chunked 的汇总字典。
+        """
+        file_columns, rows = iter_import_rows(path, format, compression)
+        columns = columns or file_columns or []
         try:
-            cursor = conn.cursor()
-            cursor.executemany(query, data_list)
-            conn.commit()
-            editing_logger(f"批量插入 {cursor.rowcount} 条数据到 '{table_name}'。")
-            return cursor.rowcount
-        except Error as e:
-            editing_logger(f"批量插入数据时发生错误: {e}")
-            conn.rollback()
-            return None
+            return self.bulk_insert_chunked(table_name, columns, rows, **chunk_kwargs)
         finally:
-            if cursor:
-                cursor.close()
+            rows.close()
+
+    def write_behind(self, table_name, columns, **kwargs):
+        """
+        创建绑定到该管理器的异步写入队列，参数见 WriteBehindQueue；要求连接池模式 (设置 pool_size)。
+        :return: WriteBehindQueue 实例，使用完毕需调用 close()。
+        """
+        return WriteBehindQueue(self, table_name, columns, **kwargs)
 
     def select(
         self,
@@ -237,6 +2179,8 @@ class MySQLManager:
         order_by=None,
         limit=None,
         fetch_all=True,
+        row_format="dict",
+        use_cache=True,
     ):
         """
         查询数据。
@@ -247,24 +2191,297 @@ class MySQLManager:
         :param order_by: ORDER BY 子句字符串，例如 "age DESC"。
         :param limit: LIMIT 子句整数，例如 10。
         :param fetch_all: 如果为 True，获取所有匹配的行；如果为 False，获取第一行。
+        :param row_format: 结果行格式，见 execute_query。
+        :param use_cache: 配置了 query_cache 时是否使用缓存 (事务内始终不使用)。
         :return: 查询结果 (列表或字典)，或 None。
         """
         if isinstance(columns, list):
             columns = ", ".join(columns)
 
-        query = f"SELECT {columns} FROM {table_name}"
-        if conditions:
-            query += f" WHERE {conditions}"
-        if order_by:
-            query += f" ORDER BY {order_by}"
-        if limit is not None:
-            query += f" LIMIT {limit}"
+        query = select_sql(table_name, columns, conditions, order_by, limit)
+
+        cache_key = None
+        if use_cache and self.query_cache is not None and not self._in_transaction():
+            cache_key = QueryCache.make_key(query, params, fetch_all, row_format)
+            if cache_key is not None:
+                hit, cached = self.query_cache.get(cache_key)
+                if hit:
+                    return cached
 
         result = self.execute_query(
-            query, params=params, fetch_all=fetch_all, fetch_one=not fetch_all
+            query, params=params, fetch_all=fetch_all, fetch_one=not fetch_all,
+            row_format=row_format, prepared=True,
         )
+        if self.column_codec is not None and row_format == "dict":
+            self.column_codec.decode_rows(table_name, result)
+        if cache_key is not None and result is not None:
+            self.query_cache.set(table_name, cache_key, result)
         return result
 
+    def select_iter(
+        self,
+        table_name,
+        columns="*",
+        conditions=None,
+        params=None,
+        order_by=None,
+        limit=None,
+        batch_size=1000,
+    ):
+        """
+        流式查询数据，参数与 select 相同，逐行产出结果而不是一次性返回列表。
+        :param batch_size: 每次从服务器读取的行数。
+        :return: 逐行产出字典的生成器。
+        """
+        if isinstance(columns, list):
+            columns = ", ".join(columns)
+
+        query = select_sql(table_name, columns, conditions, order_by, limit)
+        rows = self.execute_iter(query, params=params, batch_size=batch_size)
+        if self.column_codec is None or not self.column_codec.columns(table_name):
+            return rows
+        return (self.column_codec.decode_rows(table_name, row) for row in rows)
+
+    def train_column_dictionary(self, table_name, column, sample_size=2000, dict_size=112640):
+        """
+        用表中已有的行训练 column_codec 的 zstd 压缩字典，对大量相似的短文本 (例如提示词) 能明显提高压缩率。
+        训练后的字典需要通过 column_codec.dictionary 持久化，之后创建 ColumnCodec 时传入 dictionaries 才能解压。
+        :param table_name: 表名。
+        :param column: 采样的列名。
+        :param sample_size: 采样行数。
+        :param dict_size: 字典的最大字节数。
+        :return: 字典内容 (bytes)，没有样本或出错时返回 None。
+        """
+        if self.column_codec is None:
+            raise ValueError("train_column_dictionary 需要先配置 column_codec。")
+        rows = self.execute_query(
+            f"SELECT {column} FROM {table_name} WHERE {column} IS NOT NULL LIMIT %s",
+            params=(int(sample_size),),
+            fetch_all=True,
+        )
+        if not rows:
+            logger.error(f"'{table_name}.{column}' 没有可用于训练字典的样本。")
+            return None
+        samples = [self.column_codec.decode(row[column]) for row in rows]
+        try:
+            dictionary = self.column_codec.train_dictionary(samples, dict_size)
+        except ImportError:
+            raise
+        except Exception as e:  # 样本过少时 zstd 训练失败
+            logger.error(f"训练压缩字典时发生错误: {e}")
+            return None
+        editing_logger(f"已用 {len(samples)} 行样本训练 '{table_name}.{column}' 的压缩字典，{len(dictionary)} 字节。")
+        return dictionary
+
+
+    def select_pages(
+        self,
+        table_name,
+        key_columns,
+        columns="*",
+        conditions=None,
+        params=None,
+        page_size=1000,
+        cursor=None,
+        descending=False,
+    ):
+        """
+        键集分页 (keyset pagination) 查询：按 key_columns 排序，每页用上一页最后一行的键值
+        作为 WHERE (k) > (last) 条件，而不是 OFFSET，因此每页耗时与页码无关。
+        :param table_name: 表名。
+        :param key_columns: 排序键列名或列名列表，组合必须唯一 (例如主键)，最好有索引。
+        :param columns: 要查询的列名，键列会被自动补充到结果中。
+        :param conditions: 额外的 WHERE 条件字符串。
+        :param params: 条件对应的参数。
+        :param page_size: 每页行数。
+        :param cursor: 之前返回的游标字符串，从该位置之后继续读取。
+        :param descending: 如果为 True，按键列倒序分页。
+        :return: 惰性产出 (rows, next_cursor) 的生成器；next_cursor 可保存下来用于断点续读。
+        """
+        if isinstance(key_columns, str):
+            key_columns = [key_columns]
+        if columns != "*":
+            if isinstance(columns, str):
+                columns = [col.strip() for col in columns.split(",")]
+            columns = list(columns) + [key for key in key_columns if key not in columns]
+            columns = ", ".join(columns)
+
+        direction = "DESC" if descending else "ASC"
+        comparator = "<" if descending else ">"
+        if len(key_columns) == 1:
+            key_condition = f"{key_columns[0]} {comparator} %s"
+        else:
+            key_condition = (
+                f"({', '.join(key_columns)}) {comparator} "
+                f"({', '.join(['%s'] * len(key_columns))})"
+            )
+        order_by = ", ".join(f"{key} {direction}" for key in key_columns)
+        base_params = tuple(params or ())
+        last_key = decode_page_cursor(cursor) if cursor else None
+
+        while True:
+            where = []
+            page_params = base_params
+            if conditions:
+                where.append(f"({conditions})")
+            if last_key is not None:
+                where.append(key_condition)
+                page_params = base_params + tuple(last_key)
+            query = f"SELECT {columns} FROM {table_name}"
+            if where:
+                query += f" WHERE {' AND '.join(where)}"
+            query += f" ORDER BY {order_by} LIMIT {int(page_size)}"
+
+            rows = self.execute_query(query, params=page_params, fetch_all=True)
+            if not rows:
+                return
+            last_key = [rows[-1][key] for key in key_columns]
+            if self.column_codec is not None:
+                self.column_codec.decode_rows(table_name, rows)
+            yield rows, encode_page_cursor(last_key)
+            if len(rows) < page_size:
+                return
+
+    def parallel_scan(
+        self,
+        table_name,
+        key_column,
+        workers=4,
+        columns="*",
+        conditions=None,
+        params=None,
+        chunks=None,
+        batch_size=1000,
+        retries=3,
+        yield_batches=False,
+    ):
+        """
+        并行扫描整表：按 key_column 的 MIN/MAX 把键范围均分为若干段，由 workers 个线程各自在独占连接上
+        (连接池模式下从池中借出，配置了副本时分发到副本) 流式读取，结果按到达顺序产出，不保证全局有序。
+        某段读取出错时从该段已读到的最后一个键之后重试，最多 retries 次；重试耗尽 (或工作线程发生其他异常) 时
+        停止扫描并在调用方抛出该异常，不会把缺少某段的结果当作完整结果。调用方提前停止迭代时所有线程会尽快退出。扫描在独立连接上进行，看不到当前线程未提交的事务写入。
+        :param table_name: 表名。
+        :param key_column: 分段用的整数键列 (通常为自增主键)；非整数键时退化为单段顺序扫描。
+        :param workers: 并发线程数，建议不超过连接池大小。
+        :param columns: 要查询的列名，键列会被自动补充到结果中。
+        :param conditions: 额外的 WHERE 条件字符串。
+        :param params: 条件对应的参数。
+        :param chunks: 分段数，默认为 workers * 4，使各线程负载更均衡。
+        :param batch_size: 每次 fetchmany 读取的行数。
+        :param retries: 每段出错时的最大重试次数。
+        :param yield_batches: 如果为 True，逐批产出行列表；否则逐行产出字典。
+        :return: 产出行 (或行列表) 的生成器。
+        """
+        if columns != "*":
+            if isinstance(columns, str):
+                columns = [col.strip() for col in columns.split(",")]
+            if key_column not in columns:
+                columns = list(columns) + [key_column]
+            columns = ", ".join(columns)
+        base_params = tuple(params or ())
+        where = f" WHERE {conditions}" if conditions else ""
+
+        bounds = self.execute_query(
+            f"SELECT MIN({key_column}) AS low, MAX({key_column}) AS high FROM {table_name}{where}",
+            params=base_params or None,
+            fetch_one=True,
+        )
+        if not bounds or bounds["low"] is None:
+            return
+        low, high = bounds["low"], bounds["high"]
+        if isinstance(low, int) and isinstance(high, int):
+            chunks = max(1, chunks or workers * 4)
+            step = max(1, -(-(high - low + 1) // chunks))
+            ranges = [(start, min(start + step, high + 1)) for start in range(low, high + 1, step)]
+        else:
+            logger.warning(f"{key_column} 不是整数键，并行扫描退化为单段顺序扫描")
+            ranges = [(low, None)]
+
+        # 副本选择依赖当前线程的事务和 read_your_writes 状态，因此在调用线程中决定
+        use_replicas = self._read_replica() is not None
+        results = queue.Queue(maxsize=workers * 2)
+        stop = threading.Event()
+        done = object()
+
+        def publish(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan(start, end):
+            try:
+                scan_range(start, end)
+            except BaseException as e:  # 交给调用方重新抛出，避免工作线程静默退出
+                publish(e)
+
+        def scan_range(start, end):
+            last_key = None
+            attempt = 0
+            while True:
+                clauses = [f"({conditions})"] if conditions else []
+                range_params = base_params
+                if last_key is None:
+                    clauses.append(f"{key_column} >= %s")
+                    range_params += (start,)
+                else:
+                    clauses.append(f"{key_column} > %s")
+                    range_params += (last_key,)
+                if end is not None:
+                    clauses.append(f"{key_column} < %s")
+                    range_params += (end,)
+                query = (
+                    f"SELECT {columns} FROM {table_name} WHERE {' AND '.join(clauses)} "
+                    f"ORDER BY {key_column}"
+                )
+                target = self._read_replica() if use_replicas else None
+                source = target[1] if target is not None else self
+                try:
+                    for rows in source._iter_batches(query, range_params, batch_size):
+                        last_key = rows[-1][key_column]
+                        if self.column_codec is not None:
+                            self.column_codec.decode_rows(table_name, rows)
+                        if not publish(rows):
+                            return
+                    publish(done)
+                    return
+                except Error as e:
+                    if attempt >= retries or stop.is_set():
+                        raise
+                    attempt += 1
+                    logger.warning(
+                        f"并行扫描 {table_name} 区间 [{start}, {end}) 出错，"
+                        f"第 {attempt} 次重试 (从 {last_key} 之后继续): {e}"
+                    )
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db_help_scan")
+        try:
+            futures = [executor.submit(scan, start, end) for start, end in ranges]
+            pending = len(ranges)
+            while pending:
+                try:
+                    item = results.get(timeout=0.5)
+                except queue.Empty:
+                    # 所有工作线程都已结束却仍有分段未完成，说明有线程没能交回结果，不能无限等待
+                    if all(future.done() for future in futures) and results.empty():
+                        raise RuntimeError(f"并行扫描 {table_name} 的工作线程意外退出，结果不完整。")
+                    continue
+                if item is done:
+                    pending -= 1
+                elif isinstance(item, BaseException):
+                    logger.error(f"并行扫描 {table_name} 时发生错误，扫描已停止: {item}")
+                    raise item
+                elif yield_batches:
+                    yield item
+                else:
+                    yield from item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
 
     def update(self, table_name, data, conditions, params=None):
         """
@@ -282,11 +2499,10 @@ class MySQLManager:
         if not conditions:
             editing_logger("错误：更新操作必须包含 WHERE 条件，以避免全表更新。")
             return None
+        if self.column_codec is not None:
+            data = self.column_codec.encode_row(table_name, data)
 
-        set_clauses = [f"{key} = %s" for key in data.keys()]
-        set_str = ", ".join(set_clauses)
-
-        query = f"UPDATE {table_name} SET {set_str} WHERE {conditions}"
+        query = update_sql(table_name, tuple(data), conditions)
         update_params = tuple(data.values())
 
         # 将更新参数和条件参数合并
@@ -295,7 +2511,8 @@ class MySQLManager:
         else:
             final_params = update_params
 
-        affected_rows = self.execute_query(query, params=final_params, commit=True)
+        affected_rows = self.execute_query(query, params=final_params, commit=True, prepared=True)
+        self._invalidate(table_name)
         if affected_rows is not None:
             editing_logger(f"'{table_name}' 中 {affected_rows} 条数据已更新。")
         return affected_rows
@@ -312,26 +2529,315 @@ class MySQLManager:
             editing_logger("错误：删除操作必须包含 WHERE 条件，以避免全表删除。")
             return None
 
-        query = f"DELETE FROM {table_name} WHERE {conditions}"
-        affected_rows = self.execute_query(query, params=params, commit=True)
+        query = delete_sql(table_name, conditions)
+        affected_rows = self.execute_query(query, params=params, commit=True, prepared=True)
+        self._invalidate(table_name)
         if affected_rows is not None:
             editing_logger(f"'{table_name}' 中 {affected_rows} 条数据已删除。")
         return affected_rows
 
 
+class WriteBehindQueue:
+    """
+    异步写入队列 (write-behind)：调用方只把行放入有界内存队列，
+    后台线程按行数或时间窗口批量取出，以多行 INSERT 写入数据库 (组提交)。
+    队列满时 put 阻塞 (背压)；关闭前调用 flush()/close() 确保数据落库。
+    后台线程与请求线程并发使用数据库连接，因此要求连接池模式的 MySQLManager (设置 pool_size)。
+    """
+
+    def __init__(
+        self,
+        manager,
+        table_name,
+        columns,
+        batch_size=500,
+        flush_interval=1.0,
+        maxsize=10000,
+        on_error=None,
+    ):
+        """
+        :param manager: 用于写入的 MySQLManager。
+        :param table_name: 目标表名。
+        :param columns: 列名列表，put 的元组按此顺序，insert 的字典按此取值。
+        :param batch_size: 每批最多写入的行数。
+        :param flush_interval: 时间窗口 (秒)，批次未满时最多等待这么久就写入。
+        :param maxsize: 队列容量，满时 put 阻塞。
+        :param on_error: 批次写入失败时的回调，参数为 (未写入的行列表, 错误信息)；为 None 时只记录日志。
+        """
+        if manager.pool is None:
+            # 单连接模式下后台线程与请求线程会在同一个 (非线程安全的) 连接上交错收发数据包
+            raise ValueError("WriteBehindQueue 需要连接池模式的 MySQLManager (设置 pool_size)。")
+        self.manager = manager
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.written_rows = 0
+        self.failed_rows = 0
+        self._queue = queue.Queue(maxsize)
+        self._flush_requested = threading.Event()
+        self._stop = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"write-behind-{table_name}", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, row, block=True, timeout=None):
+        """
+        放入一行 (按 columns 顺序的元组或列表)。
+        :param block: 队列满时是否阻塞等待。
+        :param timeout: 阻塞等待的最长时间 (秒)。
+        :return: True 如果已放入队列，False 如果队列已满或已关闭。
+        """
+        if self._closed:
+            logger.warning(f"写入队列 '{self.table_name}' 已关闭，丢弃数据。")
+            return False
+        try:
+            self._queue.put(tuple(row), block, timeout)
+            return True
+        except queue.Full:
+            logger.warning(f"写入队列 '{self.table_name}' 已满。")
+            return False
+
+    def insert(self, data, block=True, timeout=None):
+        """
+        放入一行字典数据，接口与 MySQLManager.insert 对应，但不等待提交。
+        :param data: 字典，键为列名。缺少的列写入 None。
+        :return: True 如果已放入队列，False 如果队列已满或已关闭。
+        """
+        return self.put([data.get(col) for col in self.columns], block, timeout)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if self._flush_requested.is_set() or self._stop.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        report = self.manager.bulk_insert_chunked(self.table_name, self.columns, batch)
+        self.written_rows += report["rows"]
+        if report["error"] is not None:
+            failed = batch[report["rows"]:]
+            self.failed_rows += len(failed)
+            if self.on_error is not None:
+                try:
+                    self.on_error(failed, report["error"])
+                except Exception as e:
+                    logger.error(f"写入队列失败回调发生错误: {e}")
+            else:
+                logger.error(
+                    f"写入队列 '{self.table_name}' 有 {len(failed)} 行写入失败: {report['error']}"
+                )
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"写入队列 '{self.table_name}' 后台线程发生错误: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """
+        立即写入队列中已有的全部数据，并等待写入完成。
+        """
+        self._flush_requested.set()
+        try:
+            self._queue.join()
+        finally:
+            self._flush_requested.clear()
+
+    def close(self, timeout=None):
+        """
+        停止接收新数据，写完队列中剩余数据后停止后台线程。
+        :param timeout: 等待后台线程结束的最长时间 (秒)。
+        """
+        self._closed = True
+        self._stop.set()
+        self._thread.join(timeout)
+        editing_logger(
+            f"写入队列 '{self.table_name}' 已关闭，共写入 {self.written_rows} 行，失败 {self.failed_rows} 行。"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
 
 class MySQLManagerWithVersionControler(MySQLManager):
 
-    def __init__(self, host=None, user=None, password=None, database=None, port=3306):
-        super().__init__(host, user, password, database, port)
+    def __init__(self, host=None, user=None, password=None, database=None, port=3306,
+                 version_cache=None, watermark_interval=None, version_number_column=None,
+                 delta_column=None, snapshot_interval=10, snapshot_cache_size=256, **kwargs):
+        super().__init__(host, user, password, database, port, **kwargs)
         """
 
         要求sql   首位 id int 自增
                  二位 name
                  包含 id name version 
+
+        :param version_cache: 可选的 VersionCache 实例，启用后 get_content_by_version 的结果缓存在进程内，
+                              通过本管理器的写操作 (包括 save_content) 会使对应表的缓存失效。
+        :param watermark_interval: 多进程写入时，每隔这么多秒用 MAX(id) 检查一次表是否有新写入，
+                                   有变化则使该表的缓存失效；为 None 时不检查。
+        :param version_number_column: 可选的整数版本列名 (例如 version_no，建议建立 (name, version_no) 唯一索引)。
+                                      配置后新版本号由 MAX(该列) + 1 计算并同时写入该列；
+                                      否则从 version 字符串 "1.N" 中解析 N。
+        :param delta_column: 可选的差量存储列 (例如 prompt)。启用后 save_content 只为每 snapshot_interval 个版本
+                             保存一次完整快照，其余版本保存相对于最近快照的按行差量；读取时透明还原。
+                             未启用前写入的完整文本仍按快照读取。
+        :param snapshot_interval: 两个完整快照之间最多的版本数。
+        :param snapshot_cache_size: 进程内缓存的已还原快照数 (LRU)。
         """
         #assert 特定要求的数据库
         self.select = ["name", "version", "timestamp", "prompt", "use_case"]
+        self.version_cache = version_cache
+        self.watermark_interval = watermark_interval
+        self.version_number_column = version_number_column
+        self._watermarks = {}  # table -> (检查时间, MAX(id))
+        self._watermark_lock = threading.Lock()
+        self.delta_column = delta_column
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_cache_size = snapshot_cache_size
+        self._snapshots = OrderedDict()  # (table, id) -> 完整文本
+        self._snapshot_lock = threading.Lock()
+        self._time_indexed = set()
+
+    def _invalidate(self, table_name):
+        super()._invalidate(table_name)
+        if self.version_cache is not None:
+            self.version_cache.invalidate(table_name)
+        if self.delta_column:
+            with self._snapshot_lock:
+                for key in [key for key in self._snapshots if key[0] == table_name]:
+                    del self._snapshots[key]
+
+    def _remember_snapshot(self, table_name, row_id, text):
+        with self._snapshot_lock:
+            self._snapshots[(table_name, row_id)] = text
+            self._snapshots.move_to_end((table_name, row_id))
+            while len(self._snapshots) > self.snapshot_cache_size:
+                self._snapshots.popitem(last=False)
+
+    def _snapshot_text(self, table_name, row_id, hops=0):
+        """
+        :return: id 为 row_id 的行在 delta_column 中的完整文本 (优先取快照缓存)，找不到时返回 None。
+        """
+        with self._snapshot_lock:
+            text = self._snapshots.get((table_name, row_id))
+            if text is not None:
+                self._snapshots.move_to_end((table_name, row_id))
+                return text
+        row = self.execute_query(
+            f"SELECT {self.delta_column} FROM {table_name} WHERE id = %s",
+            params=(row_id,),
+            fetch_one=True,
+        )
+        if row is None:
+            logger.error(f"找不到差量版本依赖的快照 '{table_name}' id={row_id}。")
+            return None
+        if self.column_codec is not None:
+            self.column_codec.decode_rows(table_name, row)
+        text = row[self.delta_column]
+        if is_delta(text):
+            # 快照行在读取期间被 compact_versions 改写为差量，继续沿依赖还原
+            if hops >= 8:
+                logger.error(f"'{table_name}' id={row_id} 的差量依赖层数过多。")
+                return None
+            snapshot_id, _, ops = parse_delta(text)
+            base = self._snapshot_text(table_name, snapshot_id, hops + 1)
+            if base is None:
+                return None
+            text = apply_delta(base, ops)
+        self._remember_snapshot(table_name, row_id, text)
+        return text
+
+    def _decode_content(self, table_name, row):
+        """
+        原地解压并还原差量存储的内容行。
+        :return: 成功时返回 True，差量依赖的快照缺失时返回 False。
+        """
+        if self.column_codec is not None:
+            self.column_codec.decode_rows(table_name, row)
+        if self.delta_column and is_delta(row.get(self.delta_column)):
+            snapshot_id, _, ops = parse_delta(row[self.delta_column])
+            base = self._snapshot_text(table_name, snapshot_id)
+            if base is None:
+                return False
+            row[self.delta_column] = apply_delta(base, ops)
+        return True
+
+    def _delta_value(self, table_name, name, text):
+        """
+        为 name 的新版本文本选择存储形式：距最近快照的版本数达到 snapshot_interval、
+        或差量不比全文小很多时保存全文 (新快照)，否则返回相对于最近快照的差量。
+        """
+        name_id = self.select[0]
+        latest = self.execute_query(
+            f"SELECT id, {self.delta_column} FROM {table_name} WHERE {name_id} = %s ORDER BY id DESC LIMIT 1",
+            params=(name,),
+            fetch_one=True,
+        )
+        if not latest:
+            return text
+        if self.column_codec is not None:
+            self.column_codec.decode_rows(table_name, latest)
+        value = latest[self.delta_column]
+        if is_delta(value):
+            snapshot_id, depth, _ = parse_delta(value)
+            base = None if depth + 1 >= self.snapshot_interval else self._snapshot_text(table_name, snapshot_id)
+        elif isinstance(value, str):
+            snapshot_id, depth, base = latest["id"], 0, value
+            self._remember_snapshot(table_name, snapshot_id, value)
+        else:
+            return text
+        if base is None or self.snapshot_interval <= 1:
+            return text
+        delta = encode_delta(base, text, snapshot_id, depth + 1)
+        return delta if len(delta) < len(text) * 0.8 else text
+
+    def _check_watermark(self, table_name):
+        """
+        距上次检查超过 watermark_interval 时查询 MAX(id)，与上次不同说明有其他进程写入，使该表的缓存失效。
+        """
+        now = time.monotonic()
+        with self._watermark_lock:
+            previous = self._watermarks.get(table_name)
+            if previous is not None and now - previous[0] < self.watermark_interval:
+                return
+            # 先占位，避免多个线程同时检查
+            self._watermarks[table_name] = (now, previous[1] if previous else None)
+        # 只读进程的单连接会一直停留在第一次读取时的快照上，看不到其他进程的写入
+        self._refresh_snapshot()
+        row = self.execute_query(f"SELECT MAX(id) AS max_id FROM {table_name}", fetch_one=True)
+        if row is None:
+            return
+        if previous is not None and row["max_id"] != previous[1]:
+            self.version_cache.invalidate(table_name)
+        with self._watermark_lock:
+            self._watermarks[table_name] = (now, row["max_id"])
 
     def _search_by_version(self,target_name,target_version,table_name,
                           ):
@@ -339,6 +2845,7 @@ class MySQLManagerWithVersionControler(MySQLManager):
         1 有值  指定version => 指定
         有值 无指定version = > 最高
         无值, 有,无指定version => 无值
+        :return: 最多一行的结果列表，查询出错时返回 None。
         """
         name_id = self.select[0]
         _select = ", ".join(self.select)
@@ -358,8 +2865,7 @@ class MySQLManagerWithVersionControler(MySQLManager):
             query = f"{base_query} ORDER BY timestamp DESC, version DESC LIMIT 1"
             # 注意：这里params只需要target_name，因为ORDER BY和LIMIT不依赖额外的参数
 
-        result = self.execute_query(query, params=tuple(params), fetch_one=True)
-        return result
+        return self.execute_query(query, params=tuple(params), fetch_all=True)
 
     def get_content_by_version(self,
                              target_name,
@@ -369,77 +2875,418 @@ class MySQLManagerWithVersionControler(MySQLManager):
         
         """
         从sql获取提示词
+        配置了 version_cache 时先查缓存 (包括不存在的负缓存)，命中时不访问数据库。
         """
-        result = self._search_by_version(
-                target_name = target_name,
-                target_version = target_version,
-                table_name = table_name,
-            )
-        if not result:
-            result = self._search_by_version(
+        cache = self.version_cache
+        if cache is not None:
+            if self.watermark_interval is not None:
+                self._check_watermark(table_name)
+            hit, result = cache.get(table_name, target_name, target_version)
+            if hit:
+                return result
+
+        rows = self._search_by_version(
                 target_name = target_name,
                 target_version = target_version,
                 table_name = table_name,
             )
+        if rows is None:
+            return None  # 查询出错，不写入缓存
+        result = rows[0] if rows else None
+        if result is not None and not self._decode_content(table_name, result):
+            return None
+        if cache is not None:
+            cache.set(table_name, target_name, target_version, result)
         return result
 
-    def save_content(self,table_name,data):
-        target_name = data['name']
-        latest_version = self.get_content_by_version(
-                             target_name,
-                             table_name,
-                             target_version = None)
-        if latest_version:
-            # 如果存在版本加1
-            version_ori = latest_version.get("version")
-            _, version = version_ori.split(".")
-            version = int(version)
-            version += 1
-            version_ = f"1.{version}"
-        else:
-            # 如果不存在版本为1.0
-            version_ = '1.0'
-        data.update({"version":version_})
-        self.insert(table_name, data)
+    def get_latest_many(self, table_name, names, chunk_size=500):
+        """
+        批量获取多个名称的最新版本 (与 get_content_by_version 相同，按 timestamp、version 倒序取第一条)。
+        每 chunk_size 个名称用一条带 ROW_NUMBER() 窗口函数的查询 (需要 MySQL 8.0+)，而不是每个名称一次查询；
+        配置了 version_cache 时只查询缓存未命中的名称。
+        :param table_name: 表名。
+        :param names: 名称列表。
+        :param chunk_size: 每条查询包含的名称数。
+        :return: {名称: 内容行或 None (不存在)}，查询出错时返回 None。
+        """
+        name_id = self.select[0]
+        _select = ", ".join(self.select)
+        result, missing = self._from_version_cache(table_name, [(name, None) for name in names])
+        for start in range(0, len(missing), chunk_size):
+            chunk = [name for name, _ in missing[start:start + chunk_size]]
+            query = f"""
+                SELECT id, {_select} FROM (
+                    SELECT id, {_select},
+                           ROW_NUMBER() OVER (PARTITION BY {name_id} ORDER BY timestamp DESC, version DESC) AS rn
+                    FROM {table_name}
+                    WHERE {name_id} IN ({', '.join(['%s'] * len(chunk))})
+                ) ranked
+                WHERE rn = 1
+            """
+            rows = self.execute_query(query, params=tuple(chunk), fetch_all=True)
+            if rows is None:
+                return None
+            found = {row[name_id]: row for row in rows}
+            for name in chunk:
+                result[name] = self._cache_version(table_name, name, None, found.get(name))
+        return result
+
+    def get_versions_many(self, table_name, pairs, chunk_size=500):
+        """
+        批量获取指定版本：每 chunk_size 个 (名称, 版本) 用一条 WHERE (name, version) IN (...) 查询。
+        配置了 version_cache 时只查询缓存未命中的部分。
+        :param table_name: 表名。
+        :param pairs: [(名称, 版本), ...]。
+        :param chunk_size: 每条查询包含的 (名称, 版本) 数。
+        :return: {(名称, 版本): 内容行或 None (不存在)}；同一名称可以请求多个版本，因此以 (名称, 版本) 为键。
+                 查询出错时返回 None。
+        """
+        name_id = self.select[0]
+        _select = ", ".join(self.select)
+        result, missing = self._from_version_cache(table_name, pairs)
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            query = f"""
+                SELECT id, {_select}
+                FROM {table_name}
+                WHERE ({name_id}, version) IN ({', '.join(['(%s, %s)'] * len(chunk))})
+            """
+            params = tuple(value for pair in chunk for value in pair)
+            rows = self.execute_query(query, params=params, fetch_all=True)
+            if rows is None:
+                return None
+            found = {(row[name_id], row["version"]): row for row in rows}
+            for name, version in chunk:
+                result[(name, version)] = self._cache_version(
+                    table_name, name, version, found.get((name, version))
+                )
+        return result
 
+    def _from_version_cache(self, table_name, pairs):
+        """
+        :return: (已命中的结果字典, 未命中的 (名称, 版本) 列表)；latest 查询 (版本为 None) 的结果以名称为键。
+        """
+        result = {}
+        missing = []
+        for name, version in dict.fromkeys(tuple(pair) for pair in pairs):
+            key = name if version is None else (name, version)
+            if self.version_cache is not None:
+                hit, row = self.version_cache.get(table_name, name, version)
+                if hit:
+                    result[key] = row
+                    continue
+            missing.append((name, version))
+        return result, missing
 
+    def _cache_version(self, table_name, name, version, row):
+        if row is not None and not self._decode_content(table_name, row):
+            return None
+        if self.version_cache is not None:
+            self.version_cache.set(table_name, name, version, row)
+        return row
 
-        
+    def _version_number_sql(self):
+        """
+        :return: 计算某个名称当前最大版本序号 N 的 SQL 聚合表达式。
+        """
+        if self.version_number_column:
+            return f"MAX({self.version_number_column})"
+        return "MAX(CAST(SUBSTRING_INDEX(version, '.', -1) AS UNSIGNED))"
+
+    def _retry_version_conflict(self, work, retries):
+        """
+        在事务中执行 work()，遇到并发分配版本号导致的重复键或死锁时整体重试。
+        已处于外层事务中时不重试 (死锁会回滚整个外层事务)，错误直接抛出。
+        :return: work() 的返回值，失败时返回 None。
+        """
+        attempts = 1 if self._in_transaction() else retries + 1
+        for attempt in range(attempts):
+            try:
+                with self.transaction():
+                    return work()
+            except Error as e:
+                if getattr(e, "errno", None) in VERSION_RETRY_ERRNOS and attempt + 1 < attempts:
+                    logger.warning(f"分配版本号时发生冲突，第 {attempt + 1} 次重试: {e}")
+                    time.sleep(0.01 * 2 ** attempt)
+                    continue
+                if self._in_transaction():
+                    raise
+                logger.error(f"保存内容时发生错误: {e}")
+                return None
 
-    def search_by_time(self, start_time: datetime, end_time: datetime = None):
+    def save_content(self, table_name, data, retries=5):
         """
-        #TODO 
-        根据时间范围获取指定内容。
+        保存一个新版本：在数据库中用一条 INSERT ... SELECT 计算下一个版本号 ("1.0"、"1.1"、...) 并插入，
+        与读回版本号的查询一起一次往返发送，然后提交。并发写入同一名称时由 InnoDB 加锁保证版本不重复，
+        发生死锁或重复键时自动重试。
+        启用 delta_column 时会先读取该名称最近的一行，以决定保存完整快照还是差量。
+        :param table_name: 表名 (首列 id 为自增主键)。
+        :param data: 字典，必须包含 name；其中的 version 会被忽略，保存后写回分配到的版本号。
+        :param retries: 冲突时的最大重试次数。
+        :return: 分配到的版本号字符串，失败时返回 None。
+        """
+        name_id = self.select[0]
+        data.pop("version", None)
+        if self.version_number_column:
+            data.pop(self.version_number_column, None)
+        values = data
+        if self.delta_column and isinstance(data.get(self.delta_column), str):
+            values = dict(data)
+            values[self.delta_column] = self._delta_value(table_name, data[name_id], data[self.delta_column])
+        if self.column_codec is not None:
+            values = self.column_codec.encode_row(table_name, values)
+        number = f"COALESCE({self._version_number_sql()} + 1, 0)"
+        columns = list(values) + ["version"]
+        expressions = ["%s"] * len(values) + [f"CONCAT('1.', {number})"]
+        if self.version_number_column:
+            columns.append(self.version_number_column)
+            expressions.append(number)
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"SELECT {', '.join(expressions)} FROM {table_name} WHERE {name_id} = %s"
+        )
+        params = tuple(values.values()) + (data[name_id],)
+
+        def work():
+            results = self.execute_batch([
+                (query, params, "commit"),
+                (f"SELECT version FROM {table_name} WHERE id = LAST_INSERT_ID()", None, "fetch_one"),
+            ])
+            if not results.ok:
+                raise InterfaceError(f"保存内容失败: {results.errors}")
+            return results[1]["version"]
 
-        Args:
-            start_time (datetime): 查询的起始时间。
-            end_time (datetime, optional): 查询的结束时间。如果未提供，则只查询大于等于 start_time 的内容。
+        version = self._retry_version_conflict(work, retries)
+        if version is not None:
+            self._invalidate(table_name)
+            data["version"] = version
+            editing_logger(f"'{data[name_id]}' 已保存为版本 {version}。")
+        return version
 
-        Returns:
-            list[dict] or None: 如果找到，返回包含 new_id, name, version, timestamp, content 字段的字典列表；
-                                否则返回 None。
+    def save_contents(self, table_name, data_list, retries=5):
         """
-        table_name = "content"
-        if end_time:
-            query = f"""
-                SELECT new_id, name, version, timestamp, content
-                FROM {table_name}
-                WHERE timestamp BETWEEN %s AND %s
-                ORDER BY timestamp DESC
-            """
-            params = (start_time, end_time)
-        else:
-            query = f"""
-                SELECT new_id, name, version, timestamp, content
-                FROM {table_name}
-                WHERE timestamp >= %s
-                ORDER BY timestamp DESC
+        批量保存多个新版本：在一个短事务中用 SELECT ... GROUP BY ... FOR UPDATE 一次取出所有名称的
+        当前最大版本 (并加锁)，在本地依次分配版本号 (同一名称出现多次时递增)，再用一条多行 INSERT 写入。
+        启用 delta_column 时批量保存的版本均为完整快照，可之后用 compact_versions 转为差量。
+        :param table_name: 表名。
+        :param data_list: 字典列表，每个必须包含 name，列与第一个字典相同；保存后写回各自的版本号。
+        :param retries: 冲突时的最大重试次数。
+        :return: 与 data_list 对应的版本号列表，失败时返回 None。
+        """
+        if not data_list:
+            return []
+        name_id = self.select[0]
+        for data in data_list:
+            data.pop("version", None)
+            if self.version_number_column:
+                data.pop(self.version_number_column, None)
+        names = list(dict.fromkeys(data[name_id] for data in data_list))
+        columns = list(data_list[0]) + ["version"]
+        if self.version_number_column:
+            columns.append(self.version_number_column)
+
+        def work():
+            rows = self.execute_query(
+                f"SELECT {name_id} AS name, {self._version_number_sql()} AS number FROM {table_name} "
+                f"WHERE {name_id} IN ({', '.join(['%s'] * len(names))}) GROUP BY {name_id} FOR UPDATE",
+                params=tuple(names),
+                fetch_all=True,
+            )
+            if rows is None:
+                raise InterfaceError("查询当前版本号失败")
+            latest = {row["name"]: row["number"] for row in rows}
+            versions = []
+            data_rows = []
+            for data in data_list:
+                previous = latest.get(data[name_id])
+                number = 0 if previous is None else int(previous) + 1
+                latest[data[name_id]] = number
+                versions.append(f"1.{number}")
+                row = [data.get(col) for col in columns[: len(data_list[0])]] + [versions[-1]]
+                if self.version_number_column:
+                    row.append(number)
+                data_rows.append(row)
+            if self.bulk_insert(table_name, columns, data_rows) is None:
+                raise InterfaceError("批量插入新版本失败")
+            return versions
+
+        versions = self._retry_version_conflict(work, retries)
+        if versions is not None:
+            self._invalidate(table_name)
+            for data, version in zip(data_list, versions):
+                data["version"] = version
+            editing_logger(f"已批量保存 {len(versions)} 个版本到 '{table_name}'。")
+        return versions
+
+    def compact_versions(self, table_name, names=None, batch_size=500):
+        """
+        整理差量存储：按 (name, id) 键集分页流式扫描 delta_column，逐个名称按 snapshot_interval 重新规划
+        快照与差量——差量链过长时重建快照，完整文本的旧版本 (包括启用差量前的数据) 改写为差量。
+        只改写存储形式发生变化的行，每行的还原内容保持不变，读取方在整理期间仍可正常读取。
+        :param table_name: 表名。
+        :param names: 只整理这些名称；为 None 时整理整张表。
+        :param batch_size: 每页读取的行数。
+        :return: 汇总字典: rows (扫描行数)、rewritten (改写行数)、snapshots、deltas (整理后的快照数和差量数)、
+                 failed (无法还原而跳过的行数)。
+        """
+        if not self.delta_column:
+            raise ValueError("compact_versions 需要配置 delta_column。")
+        name_id = self.select[0]
+        column = self.delta_column
+        conditions = params = None
+        if names:
+            conditions = f"{name_id} IN ({', '.join(['%s'] * len(names))})"
+            params = tuple(names)
+        report = {"rows": 0, "rewritten": 0, "snapshots": 0, "deltas": 0, "failed": 0}
+        current_name = None
+        for rows, _ in self.select_pages(
+            table_name, [name_id, "id"], columns=[column], conditions=conditions, params=params,
+            page_size=batch_size,
+        ):
+            for row in rows:
+                report["rows"] += 1
+                if row[name_id] != current_name:
+                    current_name = row[name_id]
+                    texts = {}  # 本名称中原本为完整文本的行: id -> 文本
+                    snapshot = None  # 整理后当前快照 (id, 文本)
+                    depth = 0
+                value = row[column]
+                if is_delta(value):
+                    snapshot_id, _, ops = parse_delta(value)
+                    base = texts.get(snapshot_id) or self._snapshot_text(table_name, snapshot_id)
+                    if base is None:
+                        report["failed"] += 1
+                        continue
+                    text = apply_delta(base, ops)
+                elif isinstance(value, str):
+                    text = texts[row["id"]] = value
+                else:
+                    continue
+
+                desired = text
+                if snapshot is not None and depth + 1 < self.snapshot_interval:
+                    delta = encode_delta(snapshot[1], text, snapshot[0], depth + 1)
+                    if len(delta) < len(text) * 0.8:
+                        desired = delta
+                if desired is text:
+                    snapshot, depth = (row["id"], text), 0
+                    report["snapshots"] += 1
+                else:
+                    depth += 1
+                    report["deltas"] += 1
+                if desired != value:
+                    if self.update(table_name, {column: desired}, "id = %s", (row["id"],)) is None:
+                        report["failed"] += 1
+                    else:
+                        report["rewritten"] += 1
+        editing_logger(
+            f"'{table_name}' 差量整理完成: 扫描 {report['rows']} 行，改写 {report['rewritten']} 行，"
+            f"快照 {report['snapshots']} 个，差量 {report['deltas']} 个。"
+        )
+        return report
+
+    def ensure_time_index(self, table_name):
+        """
+        确保表上有以时间列开头的索引，没有时创建 (时间列, id) 索引，供 search_by_time 和 count_by_time 做范围扫描。
+        检查结果按表缓存在进程内。
+        :param table_name: 表名。
+        :return: 索引存在或创建成功时返回 True，出错时返回 False。
+        """
+        if table_name in self._time_indexed:
+            return True
+        time_column = self.select[2]
+        found = self.execute_query(
             """
-            params = (start_time,)
-        
-        result = self.mysql.execute_query(query, params=params, fetch_one=False)
-        if result:
-            print(f"找到时间范围从 '{start_time}' 到 '{end_time or '现在'}' 的内容数据。")
+            SELECT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s AND SEQ_IN_INDEX = 1
+            LIMIT 1
+            """,
+            params=(table_name, time_column),
+            fetch_all=True,
+        )
+        if found is None:
+            logger.error(f"检查 '{table_name}' 的时间索引失败。")
+            return False
+        if not found:
+            index_name = f"idx_{table_name}_{time_column}_id"[:64]
+            if self.execute_query(
+                f"CREATE INDEX {index_name} ON {table_name} ({time_column}, id)", commit=True
+            ) is None:
+                logger.error(f"为 '{table_name}' 创建时间索引失败。")
+                return False
+            editing_logger(f"已为 '{table_name}' 创建索引 {index_name} ({time_column}, id)。")
+        self._time_indexed.add(table_name)
+        return True
+
+    def _time_conditions(self, start_time, end_time, names):
+        time_column = self.select[2]
+        conditions = [f"{time_column} >= %s"]
+        params = [start_time]
+        if end_time is not None:
+            conditions.append(f"{time_column} < %s")
+            params.append(end_time)
+        if names:
+            conditions.append(f"{self.select[0]} IN ({', '.join(['%s'] * len(names))})")
+            params.extend(names)
+        return " AND ".join(conditions), tuple(params)
+
+    def search_by_time(
+        self, table_name, start_time: datetime, end_time: datetime = None, names=None,
+        columns=None, page_size=1000, descending=False,
+    ):
+        """
+        按时间范围流式读取内容：按 (时间列, id) 键集分页，每页一次查询，不会一次性读入整个范围。
+        首次调用时会确保时间列上有索引 (见 ensure_time_index)。
+        :param table_name: 表名。
+        :param start_time: 起始时间 (包含)。
+        :param end_time: 结束时间 (不包含)；为 None 时查询 start_time 之后的全部内容。
+        :param names: 只查询这些名称；为 None 时查询全部名称。
+        :param columns: 要查询的列，默认为 id 和 name, version, timestamp, prompt, use_case。
+        :param page_size: 每页读取的行数。
+        :param descending: 如果为 True，按时间从新到旧产出。
+        :return: 逐行产出字典的生成器；差量存储的内容会被还原，依赖的快照缺失时该列为 None。
+        """
+        time_column = self.select[2]
+        if columns is None:
+            columns = ["id"] + self.select
+        conditions, params = self._time_conditions(start_time, end_time, names)
+        self.ensure_time_index(table_name)
+        for rows, _ in self.select_pages(
+            table_name, [time_column, "id"], columns=columns, conditions=conditions, params=params,
+            page_size=page_size, descending=descending,
+        ):
+            for row in rows:
+                if not self._decode_content(table_name, row):
+                    row[self.delta_column] = None
+                yield row
+
+    def count_by_time(self, table_name, start_time: datetime, end_time: datetime = None,
+                      bucket="hour", names=None, by_name=False):
+        """
+        在服务器端按小时或天分桶统计时间范围内的版本数。
+        :param table_name: 表名。
+        :param start_time: 起始时间 (包含)。
+        :param end_time: 结束时间 (不包含)；为 None 时统计 start_time 之后的全部内容。
+        :param bucket: "hour" 或 "day"。
+        :param names: 只统计这些名称；为 None 时统计全部名称。
+        :param by_name: 如果为 True，每个桶再按名称分组。
+        :return: 按桶排序的字典列表 [{bucket, count}] (by_name 时含 name)，bucket 为桶的起始时间；出错时返回 None。
+        """
+        if bucket not in TIME_BUCKETS:
+            raise ValueError(f"不支持的分桶: {bucket}，可选 {tuple(TIME_BUCKETS)}")
+        name_id = self.select[0]
+        bucket_sql = TIME_BUCKETS[bucket].format(column=self.select[2])
+        if by_name:
+            group_by = f"bucket, {name_id}"
+            select_columns = f"{bucket_sql} AS bucket, {name_id} AS name, COUNT(*) AS count"
         else:
-            print(f"未找到时间范围从 '{start_time}' 到 '{end_time or '现在'}' 的内容数据。")
-        return result
\ No newline at end of file
+            group_by = "bucket"
+            select_columns = f"{bucket_sql} AS bucket, COUNT(*) AS count"
+        conditions, params = self._time_conditions(start_time, end_time, names)
+        self.ensure_time_index(table_name)
+        return self.execute_query(
+            f"SELECT {select_columns} FROM {table_name} WHERE {conditions} "
+            f"GROUP BY {group_by} ORDER BY {group_by}",
+            params=params,
+            fetch_all=True,
+        )
@@ -0,0 +1,593 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from mysql.connector import Error
+from mysql.connector.aio import connect
+from mysql.connector.errors import PoolError
+
+from db_help.mysql import (
+    VERSION_RETRY_ERRNOS,
+    _ConnectionLost,
+    editing_logger,
+    is_connection_error,
+    is_read_only_query,
+    logger,
+)
+
+
+async def _close_cursor(cursor):
+    """
+    关闭异步游标，忽略连接已断开等情况下的关闭错误。
+    """
+    if cursor is None:
+        return
+    try:
+        await cursor.close()
+    except Error:
+        pass
+
+
+class AsyncMySQLConnectionPool:
+    """
+    基于 asyncio 的 MySQL 连接池，行为与 MySQLConnectionPool 一致。
+    大量协程可共享少量连接，等待连接时不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        connect_kwargs,
+        pool_size=10,
+        timeout=30,
+        max_lifetime=3600,
+        idle_timeout=300,
+        ping_interval=30,
+    ):
+        """
+        :param connect_kwargs: 传给 mysql.connector.aio.connect 的连接参数字典。
+        :param pool_size: 连接池最大连接数。
+        :param timeout: 借出连接的最长等待时间 (秒)，超时抛出 PoolError。
+        :param max_lifetime: 单个连接的最大存活时间 (秒)，超过后回收，None 表示不限制。
+        :param idle_timeout: 连接的最大空闲时间 (秒)，超过后回收，None 表示不限制。
+        :param ping_interval: 连接空闲超过该时间 (秒) 才在借出前检测存活。
+        """
+        self.connect_kwargs = connect_kwargs
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._idle = deque()  # (conn, last_used)，右端为最近归还的连接
+        self._created = {}  # id(conn) -> 创建时间
+        self._size = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+
+    def _expired(self, conn, now):
+        created = self._created.get(id(conn), now)
+        return bool(self.max_lifetime) and now - created > self.max_lifetime
+
+    def _release_slot(self, conn):
+        """
+        释放一个连接占用的名额 (调用方需持有锁)。
+        """
+        self._created.pop(id(conn), None)
+        self._size -= 1
+        self._cond.notify()
+
+    async def _close_quietly(self, conns):
+        for conn in conns:
+            try:
+                await conn.close()
+            except Error:
+                pass
+
+    async def get(self):
+        """
+        借出一个连接。池中无空闲连接且已达上限时等待，超时抛出 PoolError。
+        :return: 异步 MySQL 连接对象。
+        """
+        deadline = time.monotonic() + self.timeout
+        stale = []
+        conn = None
+        last_used = None
+        try:
+            async with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("连接池已关闭。")
+                    now = time.monotonic()
+                    while (
+                        self.idle_timeout
+                        and self._idle
+                        and now - self._idle[0][1] > self.idle_timeout
+                    ):
+                        old, _ = self._idle.popleft()
+                        self._release_slot(old)
+                        stale.append(old)
+                    while self._idle:
+                        candidate, used_at = self._idle.pop()
+                        if self._expired(candidate, now):
+                            self._release_slot(candidate)
+                            stale.append(candidate)
+                            continue
+                        conn, last_used = candidate, used_at
+                        break
+                    if conn is not None:
+                        break
+                    if self._size < self.pool_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(
+                            f"等待连接池连接超时 ({self.timeout}s，池大小 {self.pool_size})。"
+                        )
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self._close_quietly(stale)
+
+        if conn is not None:
+            if time.monotonic() - last_used <= self.ping_interval or await conn.is_connected():
+                return conn
+            async with self._cond:
+                self._release_slot(conn)
+                self._size += 1
+
+        try:
+            conn = await connect(**self.connect_kwargs)
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._created[id(conn)] = time.monotonic()
+        return conn
+
+    async def put(self, conn, discard=False):
+        """
+        归还连接。
+        :param conn: 之前通过 get() 借出的连接。
+        :param discard: 如果为 True，直接关闭该连接而不放回池中。
+        """
+        if not discard and conn.in_transaction:
+            # 结束只读查询留下的隐式事务，否则下一个借用者会一直读到旧的一致性快照
+            try:
+                await conn.rollback()
+            except Error:
+                discard = True
+        now = time.monotonic()
+        async with self._cond:
+            if not (discard or self._closed or self._expired(conn, now)):
+                self._idle.append((conn, now))
+                self._cond.notify()
+                return
+            self._release_slot(conn)
+        await self._close_quietly([conn])
+
+    async def close(self):
+        """
+        关闭池中所有空闲连接，之后的 get() 会抛出 PoolError。
+        """
+        async with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            for conn in idle:
+                self._release_slot(conn)
+            self._cond.notify_all()
+        await self._close_quietly(idle)
+
+
+class AsyncMySQLManager:
+    """
+    MySQLManager 的 asyncio 版本，接口与 MySQLManager 一致，所有操作均需 await。
+    所有操作从异步连接池借出连接，适合在 FastAPI / uvicorn 等事件循环中使用。
+    """
+
+    def __init__(self,
+                 host=None,
+                 user=None,
+                 password=None,
+                 database=None, port=3306,
+                 pool_size=10,
+                 pool_timeout=30,
+                 pool_max_lifetime=3600,
+                 pool_idle_timeout=300,
+                 ping_interval=30):
+        """
+        初始化异步数据库管理器。
+        :param host: 数据库主机名或 IP 地址。
+        :param user: 数据库用户名。
+        :param password: 数据库密码。
+        :param database: 默认数据库名称。
+        :param port: 数据库端口 (默认为 3306)。
+        :param pool_size: 异步连接池大小。
+        :param pool_timeout: 从连接池借出连接的最长等待时间 (秒)。
+        :param pool_max_lifetime: 池中连接的最大存活时间 (秒)，超过后重建。
+        :param pool_idle_timeout: 池中连接的最大空闲时间 (秒)，超过后回收。
+        :param ping_interval: 连接空闲超过该时间 (秒) 才检测存活。
+        """
+        self.host = host or os.getenv("MySQL_DB_HOST")
+        self.user = user or os.getenv("MySQL_DB_USER")
+        self.password = password or os.getenv("MySQL_DB_PASSWORD")
+        self.database = database or os.getenv("MySQL_DB_NAME")
+        self.port = port
+        self.pool = AsyncMySQLConnectionPool(
+            dict(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+                port=self.port,
+            ),
+            pool_size=pool_size,
+            timeout=pool_timeout,
+            max_lifetime=pool_max_lifetime,
+            idle_timeout=pool_idle_timeout,
+            ping_interval=ping_interval,
+        )
+
+    @asynccontextmanager
+    async def _borrow(self):
+        """
+        从连接池借出一个连接并在结束后归还，获取失败时产出 None。
+        with 块异常退出 (包括 _ConnectionLost、任务被取消或超时) 时丢弃该连接：
+        被中断的查询可能在连接上留下未读完的结果，不能交给下一个借用者。
+        """
+        try:
+            conn = await self.pool.get()
+        except (Error, OSError) as e:  # 异步驱动在建连失败时可能直接抛出 OSError
+            logger.error(f"从连接池获取连接时发生错误: {e}")
+            conn = None
+        completed = False
+        try:
+            yield conn
+            completed = True
+        finally:
+            if conn is not None:
+                await self.pool.put(conn, discard=not completed)
+
+    async def close(self):
+        """
+        关闭连接池。
+        """
+        await self.pool.close()
+        editing_logger("数据库连接池已关闭。")
+
+    async def execute_query(
+        self, query, params=None, fetch_one=False, fetch_all=False, commit=False
+    ):
+        """
+        执行 SQL 查询 (用于 SELECT, INSERT, UPDATE, DELETE, DDL)。
+        :param query: 要执行的 SQL 查询字符串。
+        :param params: 查询参数 (元组或列表)，用于参数化查询。
+        :param fetch_one: 如果为 True，则获取单行结果 (用于 SELECT)。
+        :param fetch_all: 如果为 True，则获取所有结果 (用于 SELECT)。
+        :param commit: 如果为 True，则提交事务 (用于 INSERT, UPDATE, DELETE, DDL)。
+        :return: 查询结果 (如果是 SELECT)，或 None。
+        """
+        retryable = not commit and is_read_only_query(query)
+        try:
+            return await self._execute(query, params, fetch_one, fetch_all, commit)
+        except _ConnectionLost as e:
+            if not retryable:
+                logger.error(f"执行查询时-连接已断开: {e.error}")
+                return None
+            logger.warning(f"连接已断开，重连后重试只读查询: {e.error}")
+        try:
+            return await self._execute(query, params, fetch_one, fetch_all, commit)
+        except _ConnectionLost as e:
+            logger.error(f"执行查询时-连接已断开: {e.error}")
+            return None
+
+    async def _execute(self, query, params, fetch_one, fetch_all, commit):
+        async with self._borrow() as conn:
+            if not conn:
+                return None
+
+            cursor = None
+            result = None
+            try:
+                cursor = await conn.cursor(dictionary=True)
+                await cursor.execute(query, params)
+
+                if commit:
+                    await conn.commit()
+                    editing_logger(f"Query committed. Affected rows: {cursor.rowcount}")
+                    result = (
+                        cursor.lastrowid
+                        if query.strip().upper().startswith("INSERT")
+                        else cursor.rowcount
+                    )
+                elif fetch_one:
+                    result = await cursor.fetchone()
+                elif fetch_all:
+                    result = await cursor.fetchall()
+
+            except Error as e:
+                if is_connection_error(e):
+                    raise _ConnectionLost(e)
+                logger.error(f"执行查询时-发生错误: {e}")
+                await conn.rollback()
+                result = None
+            finally:
+                await _close_cursor(cursor)
+            return result
+
+    # --- CRUD 操作封装 ---
+
+    async def create_table(self, table_name, columns_definition):
+        """
+        创建表。
+        :param table_name: 要创建的表名。
+        :param columns_definition: 列定义字符串。
+        :return: True 如果成功，False 如果失败。
+        """
+        if not self.database:
+            logger.error("错误：未指定数据库，无法创建表。")
+            return False
+        query = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_definition})"
+        result = await self.execute_query(query, commit=True)
+        if result is not None:
+            editing_logger(f"表 '{table_name}' 已成功创建或已存在。")
+            return True
+        return False
+
+    async def insert(self, table_name, data):
+        """
+        插入单条数据。
+        :param table_name: 表名。
+        :param data: 字典，键为列名，值为要插入的数据。
+        :return: 新插入记录的 ID (如果表有自增主键)，否则返回 None。
+        """
+        if not data:
+            logger.warning("错误：插入数据为空。")
+            return None
+
+        columns = ", ".join(data.keys())
+        placeholders = ", ".join(["%s"] * len(data))
+        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        params = tuple(data.values())
+
+        last_row_id = await self.execute_query(query, params=params, commit=True)
+        if last_row_id is not None:
+            editing_logger(f"数据已成功插入到 '{table_name}'，ID: {last_row_id}")
+        return last_row_id
+
+    async def bulk_insert(self, table_name, columns, data_list):
+        """
+        批量插入数据。
+        :param table_name: 表名。
+        :param columns: 列名列表，例如 ['name', 'age', 'email']。
+        :param data_list: 包含元组或列表的列表，每个元组/列表代表一行数据。
+        :return: 影响的行数，或 None。
+        """
+        if not data_list:
+            logger.warning("错误：批量插入数据为空。")
+            return None
+
+        cols_str = ", ".join(columns)
+        placeholders = ", ".join(["%s"] * len(columns))
+        query = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders})"
+
+        try:
+            async with self._borrow() as conn:
+                if not conn:
+                    return None
+
+                cursor = None
+                try:
+                    cursor = await conn.cursor()
+                    await cursor.executemany(query, data_list)
+                    await conn.commit()
+                    editing_logger(f"批量插入 {cursor.rowcount} 条数据到 '{table_name}'。")
+                    return cursor.rowcount
+                except Error as e:
+                    if is_connection_error(e):
+                        raise _ConnectionLost(e)
+                    editing_logger(f"批量插入数据时发生错误: {e}")
+                    await conn.rollback()
+                    return None
+                finally:
+                    await _close_cursor(cursor)
+        except _ConnectionLost as e:
+            logger.error(f"批量插入数据时连接已断开: {e.error}")
+            return None
+
+    async def select(
+        self,
+        table_name,
+        columns="*",
+        conditions=None,
+        params=None,
+        order_by=None,
+        limit=None,
+        fetch_all=True,
+    ):
+        """
+        查询数据。
+        :param table_name: 表名。
+        :param columns: 要查询的列名，可以是字符串 "col1, col2" 或列表 ["col1", "col2"]，默认为 "*"。
+        :param conditions: WHERE 子句的条件字符串，例如 "age > %s AND name LIKE %s"。
+        :param params: 条件对应的参数 (元组或列表)。
+        :param order_by: ORDER BY 子句字符串，例如 "age DESC"。
+        :param limit: LIMIT 子句整数，例如 10。
+        :param fetch_all: 如果为 True，获取所有匹配的行；如果为 False，获取第一行。
+        :return: 查询结果 (列表或字典)，或 None。
+        """
+        if isinstance(columns, list):
+            columns = ", ".join(columns)
+
+        query = f"SELECT {columns} FROM {table_name}"
+        if conditions:
+            query += f" WHERE {conditions}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        if limit is not None:
+            query += f" LIMIT {limit}"
+
+        return await self.execute_query(
+            query, params=params, fetch_all=fetch_all, fetch_one=not fetch_all
+        )
+
+    async def update(self, table_name, data, conditions, params=None):
+        """
+        更新数据。
+        :param table_name: 表名。
+        :param data: 字典，键为要更新的列名，值为新数据。
+        :param conditions: WHERE 子句的条件字符串，例如 "id = %s"。
+        :param params: 条件对应的参数 (元组或列表)。
+        :return: 影响的行数，或 None。
+        """
+        if not data:
+            editing_logger("错误：更新数据为空。")
+            return None
+        if not conditions:
+            editing_logger("错误：更新操作必须包含 WHERE 条件，以避免全表更新。")
+            return None
+
+        set_str = ", ".join(f"{key} = %s" for key in data.keys())
+        query = f"UPDATE {table_name} SET {set_str} WHERE {conditions}"
+        final_params = tuple(data.values()) + tuple(params or ())
+
+        affected_rows = await self.execute_query(query, params=final_params, commit=True)
+        if affected_rows is not None:
+            editing_logger(f"'{table_name}' 中 {affected_rows} 条数据已更新。")
+        return affected_rows
+
+    async def delete(self, table_name, conditions, params=None):
+        """
+        删除数据。
+        :param table_name: 表名。
+        :param conditions: WHERE 子句的条件字符串，例如 "id = %s"。
+        :param params: 条件对应的参数 (元组或列表)。
+        :return: 影响的行数，或 None。
+        """
+        if not conditions:
+            editing_logger("错误：删除操作必须包含 WHERE 条件，以避免全表删除。")
+            return None
+
+        query = f"DELETE FROM {table_name} WHERE {conditions}"
+        affected_rows = await self.execute_query(query, params=params, commit=True)
+        if affected_rows is not None:
+            editing_logger(f"'{table_name}' 中 {affected_rows} 条数据已删除。")
+        return affected_rows
+
+
+class AsyncMySQLManagerWithVersionControler(AsyncMySQLManager):
+    """
+    MySQLManagerWithVersionControler 的 asyncio 版本。
+    """
+
+    def __init__(self, host=None, user=None, password=None, database=None, port=3306, **kwargs):
+        super().__init__(host, user, password, database, port, **kwargs)
+        self.select_columns = ["name", "version", "timestamp", "prompt", "use_case"]
+
+    async def _search_by_version(self, target_name, target_version, table_name):
+        """
+        有值 指定version => 指定
+        有值 无指定version => 最高
+        无值 => 无值
+        """
+        name_id = self.select_columns[0]
+        _select = ", ".join(self.select_columns)
+        base_query = f"""
+            SELECT id, {_select}
+            FROM {table_name}
+            WHERE {name_id} = %s
+        """
+        params = [target_name]
+
+        if target_version is not None:
+            query = f"{base_query} AND version = %s LIMIT 1"
+            params.append(target_version)
+        else:
+            query = f"{base_query} ORDER BY timestamp DESC, version DESC LIMIT 1"
+
+        return await self.execute_query(query, params=tuple(params), fetch_one=True)
+
+    async def get_content_by_version(self,
+                                     target_name,
+                                     table_name,
+                                     target_version=None,
+                                     ):
+        """
+        从sql获取提示词
+        """
+        return await self._search_by_version(
+            target_name=target_name,
+            target_version=target_version,
+            table_name=table_name,
+        )
+
+    async def _insert_version(self, query, params, table_name):
+        """
+        在同一个连接的事务中执行分配版本号的 INSERT ... SELECT 并读回版本号，然后提交。
+        :return: 分配到的版本号，无法获取连接时返回 None；SQL 出错时回滚并抛出 Error (连接断开时抛出 _ConnectionLost)。
+        """
+        error = None
+        async with self._borrow() as conn:
+            if not conn:
+                return None
+            cursor = None
+            try:
+                cursor = await conn.cursor(dictionary=True)
+                await cursor.execute(query, params)
+                await cursor.execute(f"SELECT version FROM {table_name} WHERE id = LAST_INSERT_ID()")
+                row = await cursor.fetchone()
+                await conn.commit()
+                return row["version"] if row else None
+            except Error as e:
+                if is_connection_error(e):
+                    raise _ConnectionLost(e)
+                await conn.rollback()
+                error = e
+            finally:
+                await _close_cursor(cursor)
+        # 在归还连接之后再抛出，冲突重试不必丢弃连接
+        raise error
+
+    async def save_content(self, table_name, data, retries=5):
+        """
+        保存一个新版本，与 MySQLManagerWithVersionControler.save_content 相同：在数据库中用一条
+        INSERT ... SELECT 计算下一个版本号 ("1.0"、"1.1"、...) 并插入，并发写入同一名称时由 InnoDB 加锁
+        保证版本不重复，发生死锁或重复键时自动重试。
+        :param table_name: 表名 (首列 id 为自增主键)。
+        :param data: 字典，必须包含 name；其中的 version 会被忽略，保存后写回分配到的版本号。
+        :param retries: 冲突时的最大重试次数。
+        :return: 分配到的版本号字符串，失败时返回 None。
+        """
+        name_id = self.select_columns[0]
+        data.pop("version", None)
+        number = "COALESCE(MAX(CAST(SUBSTRING_INDEX(version, '.', -1) AS UNSIGNED)) + 1, 0)"
+        columns = list(data) + ["version"]
+        expressions = ["%s"] * len(data) + [f"CONCAT('1.', {number})"]
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"SELECT {', '.join(expressions)} FROM {table_name} WHERE {name_id} = %s"
+        )
+        params = tuple(data.values()) + (data[name_id],)
+
+        for attempt in range(retries + 1):
+            try:
+                version = await self._insert_version(query, params, table_name)
+            except _ConnectionLost as e:
+                logger.error(f"保存内容时连接已断开: {e.error}")
+                return None
+            except Error as e:
+                if getattr(e, "errno", None) in VERSION_RETRY_ERRNOS and attempt < retries:
+                    logger.warning(f"分配版本号时发生冲突，第 {attempt + 1} 次重试: {e}")
+                    await asyncio.sleep(0.01 * 2 ** attempt)
+                    continue
+                logger.error(f"保存内容时发生错误: {e}")
+                return None
+            if version is not None:
+                data["version"] = version
+                editing_logger(f"'{data[name_id]}' 已保存为版本 {version}。")
+            return version
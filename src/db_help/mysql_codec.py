@@ -0,0 +1,194 @@
+import threading
+import zlib
+
+# 压缩值的首字节。0xF8-0xFF 不会出现在合法 UTF-8 的开头，因此未压缩的旧数据 (UTF-8 文本) 不会被误判
+HEADER_ZLIB = 0xF8
+HEADER_ZSTD = 0xF9
+HEADER_ZSTD_DICT = 0xFA
+CODECS = ("zlib", "zstd")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("codec='zstd' 和字典训练需要安装 zstandard。") from e
+    return zstandard
+
+
+class ColumnCodec:
+    """
+    大文本列的客户端透明压缩：写入前压缩为 "首字节 + 压缩数据"，读取时按首字节识别编码并解压，
+    不带首字节的旧数据原样按 UTF-8 文本返回。
+    被压缩的列需要是二进制类型 (BLOB/MEDIUMBLOB/LONGBLOB 或 VARBINARY)，TEXT 列可以直接
+    ALTER TABLE ... MODIFY 为 LONGBLOB，已有 UTF-8 文本按字节原样保留。
+    """
+
+    def __init__(self, columns, codec="zstd", level=None, min_size=128, dictionaries=None):
+        """
+        :param columns: 要压缩的列名列表 (所有表)，或 {表名: [列名, ...]}。
+        :param codec: "zstd" (需安装 zstandard) 或 "zlib"。
+        :param level: 压缩级别，默认使用各编码的默认级别。
+        :param min_size: 小于该字节数的值不压缩。
+        :param dictionaries: 之前 train_dictionary 得到的 zstd 字典 (bytes) 列表，最后一个用于压缩，
+                             全部用于解压历史数据。
+        """
+        if codec not in CODECS:
+            raise ValueError(f"不支持的 codec: {codec}，可选 {CODECS}")
+        if isinstance(columns, dict):
+            self._columns = {table: frozenset(cols) for table, cols in columns.items()}
+            self._all_tables = frozenset()
+        else:
+            self._columns = {}
+            self._all_tables = frozenset(columns)
+        self.codec = codec
+        self.level = level
+        self.min_size = min_size
+        self._dictionaries = {}  # dict_id -> ZstdCompressionDict
+        self._dictionary = None
+        # zstd 的压缩/解压对象不能被多个线程同时使用，按线程缓存
+        self._local = threading.local()
+        if codec == "zstd" or dictionaries:
+            self._zstd = _zstandard()
+        for data in dictionaries or ():
+            self.add_dictionary(data)
+
+    def columns(self, table_name):
+        """
+        :return: 该表需要压缩的列名集合。
+        """
+        return self._columns.get(table_name, self._all_tables)
+
+    @property
+    def dictionary(self):
+        """
+        当前用于压缩的 zstd 字典内容 (bytes)，需要持久化保存以便之后解压；没有时为 None。
+        """
+        return None if self._dictionary is None else self._dictionary.as_bytes()
+
+    def add_dictionary(self, data):
+        """
+        加载一个 zstd 字典并设为当前压缩字典。
+        """
+        zstd = self._zstd
+        dictionary = zstd.ZstdCompressionDict(data)
+        self._dictionaries[dictionary.dict_id()] = dictionary
+        self._dictionary = dictionary
+
+    def train_dictionary(self, samples, dict_size=112640):
+        """
+        用样本文本训练 zstd 字典并设为当前压缩字典，对大量相似的短文本能显著提高压缩率。
+        :param samples: 样本字符串或字节串的可迭代对象 (通常为表中已有的若干行)。
+        :param dict_size: 字典的最大字节数。
+        :return: 字典内容 (bytes)。
+        """
+        self._zstd = _zstandard()
+        samples = [s.encode("utf-8") if isinstance(s, str) else bytes(s) for s in samples if s]
+        dictionary = self._zstd.train_dictionary(dict_size, samples)
+        self.add_dictionary(dictionary.as_bytes())
+        return self.dictionary
+
+    def _compress(self, data):
+        if self.codec == "zlib":
+            level = -1 if self.level is None else self.level
+            return bytes([HEADER_ZLIB]) + zlib.compress(data, level)
+        dictionary = self._dictionary
+        cached = getattr(self._local, "compressor", None)  # (创建时使用的字典, 压缩器)
+        if cached is None or cached[0] is not dictionary:
+            kwargs = {"level": self.level} if self.level is not None else {}
+            if dictionary is not None:
+                kwargs["dict_data"] = dictionary
+            cached = self._local.compressor = (dictionary, self._zstd.ZstdCompressor(**kwargs))
+        header = HEADER_ZSTD_DICT if dictionary is not None else HEADER_ZSTD
+        return bytes([header]) + cached[1].compress(data)
+
+    def encode(self, value):
+        """
+        压缩单个值；None、非文本值、过短或压缩后没有变小的值原样返回。
+        """
+        if isinstance(value, str):
+            data = value.encode("utf-8")
+        elif isinstance(value, (bytes, bytearray)) and (not value or value[0] < HEADER_ZLIB):
+            data = bytes(value)
+        else:
+            return value
+        if len(data) < self.min_size:
+            return value
+        compressed = self._compress(data)
+        return compressed if len(compressed) < len(data) else value
+
+    def _decompressor(self, dict_id):
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id:
+                dictionary = self._dictionaries.get(dict_id)
+                if dictionary is None:
+                    raise ValueError(f"缺少 id 为 {dict_id} 的 zstd 字典，无法解压。")
+                decompressor = self._zstd.ZstdDecompressor(dict_data=dictionary)
+            else:
+                decompressor = self._zstd.ZstdDecompressor()
+            decompressors[dict_id] = decompressor
+        return decompressor
+
+    def decode(self, value):
+        """
+        解压单个值：带压缩首字节的返回解压后的字符串，其他二进制值按 UTF-8 解码，其余原样返回。
+        """
+        if not isinstance(value, (bytes, bytearray)) or not value:
+            return value
+        header = value[0]
+        payload = bytes(value[1:])
+        if header == HEADER_ZLIB:
+            return zlib.decompress(payload).decode("utf-8")
+        if header in (HEADER_ZSTD, HEADER_ZSTD_DICT):
+            zstd = _zstandard()
+            dict_id = zstd.get_frame_parameters(payload).dict_id if header == HEADER_ZSTD_DICT else 0
+            # 帧头中带有原始长度，必要时用 max_output_size 兜底
+            return self._decompressor(dict_id).decompress(
+                payload, max_output_size=len(payload) * 64 + 1024
+            ).decode("utf-8")
+        try:
+            return bytes(value).decode("utf-8")
+        except UnicodeDecodeError:
+            return value
+
+    def encode_row(self, table_name, data):
+        """
+        :return: 压缩指定列后的新字典 (data 为 {列名: 值})。
+        """
+        columns = self.columns(table_name)
+        if not columns:
+            return data
+        return {key: self.encode(value) if key in columns else value for key, value in data.items()}
+
+    def encode_rows(self, table_name, columns, rows):
+        """
+        :return: 逐行压缩指定列的生成器 (rows 为与 columns 对应的元组或列表)。
+        """
+        positions = [i for i, col in enumerate(columns) if col in self.columns(table_name)]
+        if not positions:
+            yield from rows
+            return
+        for row in rows:
+            row = list(row)
+            for i in positions:
+                row[i] = self.encode(row[i])
+            yield row
+
+    def decode_rows(self, table_name, rows):
+        """
+        原地解压字典行中的指定列。
+        :param rows: 字典行列表、单个字典或 None。
+        :return: rows 本身。
+        """
+        columns = self.columns(table_name)
+        if not columns or not rows:
+            return rows
+        for row in [rows] if isinstance(rows, dict) else rows:
+            for col in columns:
+                if col in row:
+                    row[col] = self.decode(row[col])
+        return rows
@@ -0,0 +1,44 @@
+import json
+from difflib import SequenceMatcher
+
+# 差量值的前缀。以 NUL 开头，不会出现在正常的提示词文本中
+DELTA_MARKER = "\x00db_help.delta\x00"
+
+
+def is_delta(value):
+    return isinstance(value, str) and value.startswith(DELTA_MARKER)
+
+
+def encode_delta(base_text, text, snapshot_id, depth):
+    """
+    生成 text 相对于快照 base_text 的按行差量。
+    格式: 标记 + "快照id:深度" + 换行 + JSON 操作列表；操作为 [起始行, 结束行] (从快照复制) 或 "插入的文本"。
+    :param snapshot_id: 快照所在行的 id。
+    :param depth: 自快照以来的版本数。
+    """
+    base_lines = base_text.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, base_lines, lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:  # replace / insert
+            ops.append("".join(lines[j1:j2]))
+    payload = json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+    return f"{DELTA_MARKER}{snapshot_id}:{depth}\n{payload}"
+
+
+def parse_delta(value):
+    """
+    :return: (快照 id, 深度, 操作列表)。
+    """
+    header, payload = value[len(DELTA_MARKER):].split("\n", 1)
+    snapshot_id, depth = header.split(":")
+    return int(snapshot_id), int(depth), json.loads(payload)
+
+
+def apply_delta(base_text, ops):
+    base_lines = base_text.splitlines(keepends=True)
+    return "".join(
+        "".join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops
+    )
@@ -0,0 +1,229 @@
+import base64
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+COMPRESSIONS = (None, "gzip", "zstd")
+
+# CSV 中表示 NULL 的字段值，与 LOAD DATA INFILE / load_file 的约定一致
+CSV_NULL = "\\N"
+# CSV 表头中二进制列的后缀，该列的值为 base64，导入时解码回字节
+CSV_BINARY_SUFFIX = ":base64"
+# NDJSON 中二进制值写为 {"$base64": "..."}，导入时解码回字节
+NDJSON_BINARY_KEY = "$base64"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("compression='zstd' 需要安装 zstandard。") from e
+    return zstandard
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("format='parquet' 需要安装 pyarrow。") from e
+    return pyarrow
+
+
+def check_export_options(fmt, compression):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}，可选 {EXPORT_FORMATS}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"不支持的压缩方式: {compression}，可选 {COMPRESSIONS}")
+
+
+def _open_binary(path, mode, compression):
+    """
+    打开 (可选压缩的) 二进制文件流，mode 为 "rb" 或 "wb"。
+    """
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "zstd":
+        zstd = _zstandard()
+        raw = open(path, mode)
+        if mode == "wb":
+            return zstd.ZstdCompressor().stream_writer(raw, closefd=True)
+        return zstd.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode)
+
+
+def _open_text(path, mode, compression):
+    return io.TextIOWrapper(_open_binary(path, mode + "b", compression), encoding="utf-8", newline="")
+
+
+def export_value(value):
+    """
+    将数据库取回的值转换为可写入 CSV/NDJSON 的基本类型：日期时间转为 MySQL 可直接解析的字符串，
+    Decimal 转为字符串以保留精度，二进制转为 base64 字符串。
+    """
+    if isinstance(value, (datetime, date, time, timedelta, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    return value
+
+
+def _base64(value):
+    if isinstance(value, str):  # 二进制列中已被 ColumnCodec 解压为文本的值
+        value = value.encode("utf-8")
+    return base64.b64encode(bytes(value)).decode("ascii")
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {NDJSON_BINARY_KEY: _base64(value)}
+    return export_value(value)
+
+
+def _json_value(value):
+    if isinstance(value, dict) and list(value) == [NDJSON_BINARY_KEY]:
+        return base64.b64decode(value[NDJSON_BINARY_KEY])
+    return value
+
+
+class _CsvWriter:
+    def __init__(self, path, compression, binary_columns=()):
+        self._file = _open_text(path, "w", compression)
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._binary_columns = set(binary_columns)
+        self._columns = None
+
+    def write(self, rows):
+        if self._columns is None:
+            self._columns = list(rows[0])
+            self._binary_columns.update(
+                col for col in self._columns
+                if any(isinstance(row[col], (bytes, bytearray)) for row in rows)
+            )
+            self._writer.writerow(
+                col + CSV_BINARY_SUFFIX if col in self._binary_columns else col for col in self._columns
+            )
+        encoders = [_base64 if col in self._binary_columns else export_value for col in self._columns]
+        self._writer.writerows(
+            [
+                CSV_NULL if row[col] is None else encode(row[col])
+                for col, encode in zip(self._columns, encoders)
+            ]
+            for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class _NdjsonWriter:
+    def __init__(self, path, compression, binary_columns=()):
+        self._file = _open_text(path, "w", compression)
+
+    def write(self, rows):
+        self._file.write(
+            "".join(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows)
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, compression, binary_columns=()):
+        self._pa = _pyarrow()
+        self._path = path
+        self._compression = compression or "none"
+        self._binary_columns = set(binary_columns)
+        self._writer = None
+
+    def write(self, rows):
+        pa = self._pa
+        if self._writer is None:
+            table = pa.Table.from_pylist(rows)
+            # 二进制列原样写为 binary 类型；首批中全为 NULL 的其他列无法推断类型，按字符串处理，避免后续批次写入失败
+            schema = pa.schema(
+                [field.with_type(pa.binary()) if field.name in self._binary_columns
+                 else field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                 for field in table.schema]
+            )
+            self._writer = pa.parquet.ParquetWriter(self._path, schema, compression=self._compression)
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self._writer.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "ndjson": _NdjsonWriter, "parquet": _ParquetWriter}
+
+
+def open_export_writer(path, fmt="csv", compression=None, binary_columns=()):
+    """
+    :param binary_columns: 二进制类型 (BLOB/BINARY) 的列名。CSV 在表头中以 CSV_BINARY_SUFFIX 标记这些列
+                           (以及首批中出现字节值的列) 并写为 base64；NDJSON 的字节值写为 {"$base64": ...}；
+                           parquet 写为 binary 类型。iter_import_rows 会把它们还原为字节。
+    :return: 带 write(rows) 和 close() 方法的写入器，rows 为字典列表；
+             parquet 的 compression 作用于列块编码而不是整个文件。
+    """
+    check_export_options(fmt, compression)
+    return _WRITERS[fmt](path, compression, binary_columns)
+
+
+def iter_import_rows(path, fmt="csv", compression=None, batch_size=5000):
+    """
+    流式读取 export_table 写出的文件，二进制列还原为字节。
+    :param batch_size: parquet 每次解码的行数。
+    :return: (columns, rows)，rows 为逐行产出元组的生成器；文件为空时 columns 为 None。
+    """
+    check_export_options(fmt, compression)
+    if fmt == "parquet":
+        pa = _pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path)
+
+        def parquet_rows():
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                yield from zip(*(column.to_pylist() for column in batch.columns))
+
+        return parquet_file.schema_arrow.names, parquet_rows()
+
+    f = _open_text(path, "r", compression)
+    if fmt == "csv":
+        reader = csv.reader(f)
+        header = next(reader, None)
+        columns = binary = None
+        if header is not None:
+            binary = [col.endswith(CSV_BINARY_SUFFIX) for col in header]
+            columns = [
+                col[:-len(CSV_BINARY_SUFFIX)] if is_binary else col for col, is_binary in zip(header, binary)
+            ]
+        rows = (
+            tuple(
+                None if v == CSV_NULL else base64.b64decode(v) if is_binary else v
+                for v, is_binary in zip(row, binary)
+            )
+            for row in reader
+        )
+    else:
+        first = f.readline()
+        columns = list(json.loads(first)) if first.strip() else None
+        lines = (line for line in _chain_first(first, f) if line.strip())
+        rows = (tuple(_json_value(json.loads(line).get(col)) for col in columns) for line in lines)
+
+    def text_rows():
+        try:
+            if columns is not None:
+                yield from rows
+        finally:
+            f.close()
+
+    return columns, text_rows()
+
+
+def _chain_first(first, f):
+    yield first
+    yield from f
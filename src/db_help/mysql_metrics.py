@@ -0,0 +1,200 @@
+import threading
+from bisect import bisect_left
+from collections import deque
+
+from db_help.log import Log
+
+logger = Log.logger
+
+# 默认延迟分桶 (秒)，与 Prometheus 客户端库的默认值一致
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def normalize_sql(query):
+    """
+    将 SQL 的空白规范化，作为语句模板 (参数化查询本身不含具体参数值)。
+    """
+    return " ".join(query.split())
+
+
+class LatencyHistogram:
+    """
+    固定分桶的延迟直方图。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        按分桶估算分位数 (返回所在桶的上界，落在 +Inf 桶时返回最大值)。
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+
+class QueryInstrumentation:
+    """
+    查询埋点：为 MySQLManager.execute_query 提供 before/after 钩子、按语句模板统计的延迟直方图、
+    慢查询日志以及 Prometheus 文本格式导出。
+    通过 MySQLManager(instrumentation=QueryInstrumentation()) 启用；未启用时没有额外开销。
+
+    after 钩子收到的事件字典包含: template、param_count、row_count、acquire_time、execute_time、
+    fetch_time、total_time (秒) 和 error (出错时为异常字符串，否则为 None)。
+    """
+
+    def __init__(
+        self,
+        buckets=DEFAULT_BUCKETS,
+        slow_query_threshold=1.0,
+        slow_query_log_size=100,
+        histograms=True,
+    ):
+        """
+        :param buckets: 直方图分桶上界 (秒)。
+        :param slow_query_threshold: 慢查询阈值 (秒)，None 表示不记录慢查询。
+        :param slow_query_log_size: 内存中保留的最近慢查询条数。
+        :param histograms: 是否按语句模板统计延迟直方图。
+        """
+        self.buckets = tuple(buckets)
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_queries = deque(maxlen=slow_query_log_size)
+        self.histograms_enabled = histograms
+        self.before_hooks = []
+        self.after_hooks = []
+        self._histograms = {}  # (template, phase) -> LatencyHistogram
+        self._lock = threading.Lock()
+
+    def add_hook(self, before=None, after=None):
+        """
+        注册钩子。before(event) 在执行前调用，event 包含 template 和 param_count；
+        after(event) 在执行后调用，event 字段见类说明。钩子中的异常会被记录并忽略。
+        """
+        if before is not None:
+            self.before_hooks.append(before)
+        if after is not None:
+            self.after_hooks.append(after)
+
+    def before(self, query, params):
+        """
+        查询开始前调用。
+        :return: 事件字典，需原样传给 after()。
+        """
+        event = {
+            "template": normalize_sql(query),
+            "param_count": len(params) if params else 0,
+        }
+        for hook in self.before_hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logger.error(f"查询埋点 before 钩子发生错误: {e}")
+        return event
+
+    def after(self, event, row_count, acquire_time, execute_time, fetch_time, error=None):
+        """
+        查询结束后调用，记录直方图、慢查询并触发 after 钩子。
+        """
+        total = acquire_time + execute_time + fetch_time
+        event.update(
+            row_count=row_count,
+            acquire_time=acquire_time,
+            execute_time=execute_time,
+            fetch_time=fetch_time,
+            total_time=total,
+            error=None if error is None else str(error),
+        )
+        template = event["template"]
+        if self.histograms_enabled:
+            with self._lock:
+                for phase, value in (
+                    ("total", total),
+                    ("acquire", acquire_time),
+                    ("execute", execute_time),
+                    ("fetch", fetch_time),
+                ):
+                    histogram = self._histograms.get((template, phase))
+                    if histogram is None:
+                        histogram = self._histograms[(template, phase)] = LatencyHistogram(self.buckets)
+                    histogram.observe(value)
+        if self.slow_query_threshold is not None and total >= self.slow_query_threshold:
+            self.slow_queries.append(dict(event))
+            logger.warning(f"慢查询 ({total:.3f}s, {row_count} 行): {template}")
+        for hook in self.after_hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logger.error(f"查询埋点 after 钩子发生错误: {e}")
+
+    def histogram(self, template, phase="total"):
+        """
+        :return: 指定语句模板和阶段 (total/acquire/execute/fetch) 的 LatencyHistogram，不存在时返回 None。
+        """
+        return self._histograms.get((normalize_sql(template), phase))
+
+    def summary(self):
+        """
+        :return: 按语句模板汇总的字典: {template: {count, avg, p50, p95, p99, max}} (基于 total 阶段)。
+        """
+        with self._lock:
+            result = {}
+            for (template, phase), h in self._histograms.items():
+                if phase != "total":
+                    continue
+                result[template] = {
+                    "count": h.count,
+                    "avg": h.sum / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                    "max": h.max,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.slow_queries.clear()
+
+    @staticmethod
+    def _label(value):
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def export_prometheus(self, metric_name="db_help_query_duration_seconds"):
+        """
+        以 Prometheus 文本格式导出直方图，标签为 template 和 phase。
+        :return: 可直接作为 /metrics 响应体的字符串。
+        """
+        lines = [
+            f"# HELP {metric_name} MySQL query latency by statement template and phase.",
+            f"# TYPE {metric_name} histogram",
+        ]
+        with self._lock:
+            for (template, phase), h in sorted(self._histograms.items()):
+                labels = f'template="{self._label(template)}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{metric_name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric_name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{metric_name}_sum{{{labels}}} {h.sum}")
+                lines.append(f"{metric_name}_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,461 @@
+import hashlib
+import heapq
+import queue
+import threading
+from bisect import bisect
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from mysql.connector import Error
+
+from db_help.mysql import MySQLManager, editing_logger, logger
+
+
+def _hash(value):
+    """
+    稳定的 64 位哈希 (与进程无关，不能用内置 hash())。
+    """
+    return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    带虚拟节点的一致性哈希环：增加节点时只有约 1/N 的键改变归属。
+    add() 会原地修改环，不是线程安全的；已被其他线程使用的环应先 copy() 再修改。
+    """
+
+    def __init__(self, nodes=(), virtual_nodes=160):
+        self.virtual_nodes = virtual_nodes
+        self._hashes = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.virtual_nodes):
+            point = _hash(f"{node}#{i}")
+            index = bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def copy(self):
+        ring = HashRing(virtual_nodes=self.virtual_nodes)
+        ring._hashes = list(self._hashes)
+        ring._nodes = list(self._nodes)
+        return ring
+
+    def node_for(self, key):
+        if not self._hashes:
+            raise ValueError("哈希环中没有分片。")
+        index = bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class _Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def order_by_key(order_by):
+    """
+    把 ORDER BY 子句 (例如 "timestamp DESC, id") 转为结果行字典的排序键函数，NULL 排在最前 (与 MySQL 升序一致)。
+    只支持按列名排序，不支持表达式。
+    """
+    parts = []
+    for item in order_by.split(","):
+        tokens = item.split()
+        column = tokens[0].split(".")[-1].strip("`")
+        descending = len(tokens) > 1 and tokens[1].upper() == "DESC"
+        parts.append((column, descending))
+
+    def key(row):
+        values = []
+        for column, descending in parts:
+            value = (row[column] is not None, row[column])
+            values.append(_Descending(value) if descending else value)
+        return tuple(values)
+
+    return key
+
+
+# 分片路由状态：哈希环、分片字典、迁移期间的旧哈希环和跨分片查询线程池，整体替换而不原地修改
+_Routing = namedtuple("_Routing", ["ring", "shards", "previous_ring", "executor"])
+
+
+class ShardedMySQLManager:
+    """
+    分片管理器：包装多个 MySQLManager，按分片键的一致性哈希把 insert/select/update/delete 路由到对应分片；
+    不带分片键的 select 并行发往所有分片并流式合并结果 (指定 order_by 时按序归并)。
+    各分片上的表结构需要相同；如果依赖自增 id，应为各分片配置不重叠的 auto_increment_offset，
+    否则 add_shard 迁移数据时 id 可能冲突。
+    """
+
+    def __init__(self, shards, shard_key="name", virtual_nodes=160, workers=None):
+        """
+        :param shards: {分片名: MySQLManager 实例或其构造参数字典}。
+        :param shard_key: 分片键列名，或 {表名: 列名}。
+        :param virtual_nodes: 每个分片在哈希环上的虚拟节点数，越多分布越均匀。
+        :param workers: 跨分片查询的并发线程数，默认为分片数。
+        """
+        self.shard_key = shard_key
+        self._lock = threading.Lock()
+        self._workers = workers
+        self._retired_executors = []  # add_shard 替换下来的线程池，close() 时关闭
+        ring = HashRing(virtual_nodes=virtual_nodes)
+        shard_map = {}
+        for name, manager in shards.items():
+            self._attach(ring, shard_map, name, manager)
+        self._routing = _Routing(ring, shard_map, None, self._new_executor(len(shard_map)))
+
+    @property
+    def shards(self):
+        """
+        {分片名: MySQLManager}，只读；add_shard 会整体替换。
+        """
+        return self._routing.shards
+
+    @property
+    def ring(self):
+        return self._routing.ring
+
+    def _new_executor(self, shard_count):
+        return ThreadPoolExecutor(
+            max_workers=self._workers or max(shard_count, 1), thread_name_prefix="db_help_shard"
+        )
+
+    @staticmethod
+    def _attach(ring, shard_map, name, manager):
+        if name in shard_map:
+            raise ValueError(f"分片 {name} 已存在。")
+        if isinstance(manager, dict):
+            manager = MySQLManager(**manager)
+        shard_map[name] = manager
+        ring.add(name)
+
+    def _key_column(self, table_name):
+        if isinstance(self.shard_key, dict):
+            return self.shard_key[table_name]
+        return self.shard_key
+
+    def shard_for(self, value):
+        """
+        :return: 分片键值 value 所属的分片名。
+        """
+        return self._routing.ring.node_for(value)
+
+    def _owners(self, value):
+        """
+        :return: 分片键值所在的分片名列表。迁移期间旧归属在前 (数据先写入新分片、再从旧分片删除，
+                 按这个顺序访问不会漏掉正在迁移的行)。
+        """
+        routing = self._routing
+        owner = routing.ring.node_for(value)
+        previous = routing.previous_ring
+        if previous is not None:
+            old_owner = previous.node_for(value)
+            if old_owner != owner:
+                return [old_owner, owner]
+        return [owner]
+
+    def _fan_out(self, call, names=None):
+        """
+        在所有 (或指定) 分片上并行调用 call(manager)。
+        :return: [(分片名, 结果), ...]，顺序与分片顺序一致。
+        """
+        routing = self._routing
+        names = list(names or routing.shards)
+        futures = [routing.executor.submit(call, routing.shards[name]) for name in names]
+        return [(name, future.result()) for name, future in zip(names, futures)]
+
+    # --- 写操作 ---
+
+    def create_table(self, table_name, columns_definition):
+        """
+        在所有分片上建表。
+        :return: 全部成功时返回 True。
+        """
+        results = self._fan_out(lambda m: m.create_table(table_name, columns_definition))
+        return all(result for _, result in results)
+
+    def insert(self, table_name, data):
+        """
+        按 data 中分片键的值插入到对应分片。
+        :return: 新记录在该分片上的 ID，或 None。
+        """
+        key_column = self._key_column(table_name)
+        if data.get(key_column) is None:
+            logger.error(f"插入 '{table_name}' 的数据缺少分片键 {key_column}。")
+            return None
+        routing = self._routing
+        return routing.shards[routing.ring.node_for(data[key_column])].insert(table_name, data)
+
+    def bulk_insert(self, table_name, columns, data_list):
+        """
+        按分片键把行分组后并行批量插入各分片。
+        :return: 各分片影响行数之和；任一分片失败时返回 None (其他分片已提交的行保留)。
+        """
+        index = list(columns).index(self._key_column(table_name))
+        routing = self._routing
+        groups = {}
+        for row in data_list:
+            groups.setdefault(routing.ring.node_for(row[index]), []).append(row)
+        futures = {
+            name: routing.executor.submit(routing.shards[name].bulk_insert, table_name, columns, rows)
+            for name, rows in groups.items()
+        }
+        results = [(name, future.result()) for name, future in futures.items()]
+        failed = [name for name, result in results if result is None]
+        if failed:
+            logger.error(f"批量插入 '{table_name}' 时分片 {failed} 失败。")
+            return None
+        return sum(result for _, result in results)
+
+    def update(self, table_name, data, conditions, params=None, shard_value=None):
+        """
+        更新数据。指定 shard_value 时只更新其所在分片，否则在所有分片上执行。不允许修改分片键。
+        :return: 影响的行数之和，或 None。
+        """
+        if self._key_column(table_name) in data:
+            logger.error(f"不能通过 update 修改分片键 {self._key_column(table_name)}，请删除后重新插入。")
+            return None
+        return self._write(
+            lambda m: m.update(table_name, data, conditions, params), shard_value
+        )
+
+    def delete(self, table_name, conditions, params=None, shard_value=None):
+        """
+        删除数据。指定 shard_value 时只在其所在分片删除，否则在所有分片上执行。
+        :return: 影响的行数之和，或 None。
+        """
+        return self._write(lambda m: m.delete(table_name, conditions, params), shard_value)
+
+    def _write(self, call, shard_value):
+        if shard_value is not None:
+            # 迁移期间按旧分片、新分片的顺序依次执行，保证与迁移中的行加锁顺序一致
+            results = [(name, call(self.shards[name])) for name in self._owners(shard_value)]
+        else:
+            results = self._fan_out(call)
+        if all(result is None for _, result in results):
+            return None
+        return sum(result or 0 for _, result in results)
+
+    # --- 查询 ---
+
+    def select(
+        self,
+        table_name,
+        columns="*",
+        conditions=None,
+        params=None,
+        order_by=None,
+        limit=None,
+        fetch_all=True,
+        shard_value=None,
+    ):
+        """
+        查询数据，参数与 MySQLManager.select 相同。
+        :param shard_value: 分片键的值；指定时只查询其所在分片 (迁移期间为旧、新两个分片)，否则并行查询所有分片。
+                            多个分片的结果合并后再应用 order_by 和 limit：有 order_by 时按序归并
+                            (每个分片各取前 limit 行)，否则按分片顺序拼接。
+        :return: 查询结果 (列表或字典)，所有分片都失败时返回 None。
+        """
+        def call(manager):
+            return manager.select(
+                table_name, columns, conditions, params, order_by, limit, fetch_all=fetch_all
+            )
+
+        names = self._owners(shard_value) if shard_value is not None else None
+        results = [result for _, result in self._fan_out(call, names) if result is not None]
+        if not results and self.shards:
+            return None
+        if not fetch_all:
+            rows = [row for row in results if row]
+            if order_by and rows:
+                return min(rows, key=order_by_key(order_by))
+            return rows[0] if rows else None
+        if order_by:
+            merged = heapq.merge(*results, key=order_by_key(order_by))
+        else:
+            merged = (row for rows in results for row in rows)
+        return list(islice(merged, limit) if limit else merged)
+
+    def select_iter(
+        self,
+        table_name,
+        columns="*",
+        conditions=None,
+        params=None,
+        order_by=None,
+        batch_size=1000,
+        shard_value=None,
+    ):
+        """
+        流式查询所有分片：每个分片在独立线程中用 select_iter 预取，内存占用与结果集大小无关。
+        有 order_by 时按序归并为全局有序的结果，否则按到达顺序产出。某个分片读取出错时在调用方抛出该异常。
+        :param shard_value: 分片键的值；指定时只查询其所在分片 (迁移期间为旧、新两个分片，结果同样归并)。
+        :return: 逐行产出字典的生成器。
+        """
+        def rows_of(manager):
+            return manager.select_iter(
+                table_name, columns, conditions, params, order_by, batch_size=batch_size
+            )
+
+        names = self._owners(shard_value) if shard_value is not None else list(self.shards)
+        managers = [self.shards[name] for name in names]
+        if not managers:
+            return
+        if order_by:
+            queues = [queue.Queue(maxsize=4) for _ in managers]
+        else:
+            shared = queue.Queue(maxsize=4 * len(managers))
+            queues = [shared] * len(managers)
+        stop = threading.Event()
+        done = object()
+
+        def publish(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def pump(manager, q):
+            rows = rows_of(manager)
+            try:
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        if not publish(q, batch):
+                            return
+                        batch = []
+                if batch:
+                    publish(q, batch)
+            except BaseException as e:  # 交给调用方重新抛出，避免把缺少某个分片的结果当作完整结果
+                publish(q, e)
+            finally:
+                rows.close()
+                publish(q, done)
+
+        def drain(q, expected):
+            finished = 0
+            while finished < expected:
+                item = q.get()
+                if item is done:
+                    finished += 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield from item
+
+        # 预取线程独立于跨分片查询线程池，避免与 select 的并发查询互相占满线程
+        threads = [
+            threading.Thread(target=pump, args=(manager, q), daemon=True)
+            for manager, q in zip(managers, queues)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            if order_by:
+                yield from heapq.merge(*(drain(q, 1) for q in queues), key=order_by_key(order_by))
+            else:
+                yield from drain(queues[0], len(managers))
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    # --- 扩容 ---
+
+    def add_shard(self, name, manager, tables=(), key_column="id", batch_size=1000):
+        """
+        加入新分片并在线迁移数据：新分片立即接收归属于它的写入；对 tables 中的每张表，
+        逐批扫描旧分片，把归属改变的行写入新分片后再从旧分片删除 (源行在迁移批次内以 FOR UPDATE 加锁)。
+        迁移期间按分片键的查询、更新和删除会同时覆盖旧、新两个归属；查询可能短暂看到正在迁移的行的两份副本。
+        :param name: 分片名。
+        :param manager: MySQLManager 实例或构造参数字典。
+        :param tables: 需要迁移的表名列表，新分片上需已建好同结构的表。
+        :param key_column: 用于分批扫描和删除的唯一键列 (通常为主键)。
+        :param batch_size: 每批扫描的行数。
+        :return: {表名: 迁移行数}；某张表迁移出错时记录错误，其值为 None，已迁移的批次保留。
+        """
+        with self._lock:
+            # 在副本上构建新的路由状态后一次性替换，并发路由的线程要么看到旧状态、要么看到新状态
+            routing = self._routing
+            ring = routing.ring.copy()
+            shard_map = dict(routing.shards)
+            self._attach(ring, shard_map, name, manager)
+            executor = routing.executor
+            if self._workers is None:
+                # 线程数随分片数增加；并发查询可能仍持有旧线程池，到 close() 时再关闭
+                self._retired_executors.append(executor)
+                executor = self._new_executor(len(shard_map))
+            self._routing = _Routing(ring, shard_map, routing.ring, executor)
+        moved = {}
+        try:
+            for table_name in tables:
+                try:
+                    moved[table_name] = sum(
+                        self._migrate(table_name, source, name, key_column, batch_size)
+                        for source in list(self.shards)
+                        if source != name
+                    )
+                    editing_logger(f"表 '{table_name}' 已迁移 {moved[table_name]} 行到新分片 {name}。")
+                except Error as e:
+                    logger.error(f"迁移表 '{table_name}' 到新分片 {name} 时发生错误: {e}")
+                    moved[table_name] = None
+        finally:
+            if all(count is not None for count in moved.values()):
+                with self._lock:
+                    self._routing = self._routing._replace(previous_ring=None)
+        return moved
+
+    def _migrate(self, table_name, source_name, target_name, key_column, batch_size):
+        source = self.shards[source_name]
+        target = self.shards[target_name]
+        shard_column = self._key_column(table_name)
+        moved = 0
+        last_key = None
+        while True:
+            with source.transaction():
+                where = f"WHERE {key_column} > %s " if last_key is not None else ""
+                rows = source.execute_query(
+                    f"SELECT * FROM {table_name} {where}ORDER BY {key_column} "
+                    f"LIMIT {int(batch_size)} FOR UPDATE",
+                    params=(last_key,) if last_key is not None else None,
+                    fetch_all=True,
+                )
+                if not rows:
+                    return moved
+                last_key = rows[-1][key_column]
+                rows = [row for row in rows if self.shard_for(row[shard_column]) == target_name]
+                if rows:
+                    columns = list(rows[0])
+                    # 先提交到新分片，再在源分片的事务中删除
+                    if target.bulk_insert(table_name, columns, [tuple(row.values()) for row in rows]) is None:
+                        raise Error(msg=f"写入新分片 {target_name} 失败")
+                    keys = [row[key_column] for row in rows]
+                    source.execute_query(
+                        f"DELETE FROM {table_name} WHERE {key_column} IN ({', '.join(['%s'] * len(keys))})",
+                        params=tuple(keys),
+                        commit=True,
+                    )
+                    source._invalidate(table_name)
+                    moved += len(rows)
+
+    def close(self):
+        for executor in [self._routing.executor] + self._retired_executors:
+            executor.shutdown(wait=True)
+        for manager in self.shards.values():
+            manager.close()
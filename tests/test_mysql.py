@@ -1,5 +1,6 @@
 import pytest
-from db_help.mysql import MySQLManager, MySQLManagerWithVersionControler
+from concurrent.futures import ThreadPoolExecutor
+from db_help.mysql import MySQLManager, MySQLManagerWithVersionControler, QueryCache, VersionCache
 from dotenv import load_dotenv
 import os
 from datetime import datetime
@@ -56,6 +57,93 @@ class Test_MySQLManager():
         db_manager.bulk_insert(table_name, ['prompt_id', 'version', 'timestamp','prompt'], bulk_data)
         db_manager.close()
 
+    def test_bulk_insert_chunked(self,db_manager):
+        table_name = "prompts_data"
+        rows = ((f"chunked_{i}", '1.0', datetime.now(), f"你好{i}") for i in range(20000))
+        report = db_manager.bulk_insert_chunked(
+            table_name, ['prompt_id', 'version', 'timestamp','prompt'], rows,
+            commit_every=2, on_chunk=print,
+        )
+        print(report)
+        db_manager.close()
+
+    def test_bulk_upsert(self,db_manager):
+        table_name = "prompts_data"
+        rows = [
+            ('2345234234', '1.0', datetime.now(),"你好22-upsert"),
+            ('2345234234', '1.9', datetime.now(),"你好29"),
+        ]
+        report = db_manager.bulk_upsert(
+            table_name, ['prompt_id', 'version', 'timestamp','prompt'], rows,
+            update_columns=['timestamp', 'prompt'],
+        )
+        print(report)
+        db_manager.close()
+
+    def test_bulk_update(self,db_manager):
+        table_name = "prompts_data"
+        rows = [
+            {'id': 1, 'prompt': "你好-bulk-1"},
+            {'id': 2, 'prompt': "你好-bulk-2", 'version': '1.5'},
+        ]
+        report = db_manager.bulk_update(table_name, 'id', rows)
+        print(report)
+        db_manager.close()
+
+    def test_transaction(self,db_manager):
+        table_name = "prompts_data"
+        with db_manager.transaction():
+            for i in range(100):
+                db_manager.insert(table_name, {'prompt_id': f'tx_{i}', 'version': '1.0', 'timestamp': datetime.now(),"prompt":"你好"})
+            try:
+                with db_manager.transaction():
+                    db_manager.insert(table_name, {'prompt_id': 'tx_savepoint', 'version': '1.0', 'timestamp': datetime.now(),"prompt":"你好"})
+                    raise ValueError("只回滚到保存点")
+            except ValueError:
+                pass
+        print(db_manager.select(table_name, conditions="prompt_id = %s", params=('tx_savepoint',)))
+        db_manager.close()
+
+    def test_load_rows(self,db_manager):
+        table_name = "prompts_data"
+        rows = ((f"load_{i}", '1.0', datetime.now(), f"你好\t{i}") for i in range(100000))
+        report = db_manager.load_rows(table_name, ['prompt_id', 'version', 'timestamp','prompt'], rows)
+        print(report)
+        db_manager.close()
+
+    def test_load_file(self,db_manager,tmp_path):
+        table_name = "prompts_data"
+        path = tmp_path / "prompts.csv"
+        path.write_text(
+            "prompt_id,version,timestamp,prompt\n"
+            "load_file_1,1.0,2024-01-01 00:00:00,你好\n"
+            "load_file_2,1.0,2024-01-01 00:00:00,\"你好, 世界\"\n",
+            encoding="utf-8",
+        )
+        report = db_manager.load_file(table_name, str(path))
+        print(report)
+        db_manager.close()
+
+    def test_execute_batch(self,db_manager):
+        table_name = "prompts_data"
+        results = db_manager.execute_batch([
+            (f"SELECT * FROM {table_name} WHERE id = %s", (1,), "fetch_one"),
+            (f"SELECT COUNT(*) AS total FROM {table_name}", None, "fetch_one"),
+            (f"SELECT * FROM {table_name} ORDER BY id DESC LIMIT %s", (3,), "fetch_all"),
+        ])
+        print(list(results), results.errors)
+        db_manager.close()
+
+    def test_export_import_table(self,db_manager,tmp_path):
+        table_name = "prompts_data"
+        path = tmp_path / "prompts.ndjson.gz"
+        report = db_manager.export_table(table_name, str(path), format="ndjson", compression="gzip",
+                                         columns=["prompt_id", "version", "timestamp", "prompt"])
+        print(report)
+        report = db_manager.import_table(table_name, str(path), format="ndjson", compression="gzip")
+        print(report)
+        db_manager.close()
+
     def test_search_all(self,db_manager):
         table_name = "prompts_data"
 
@@ -81,10 +169,161 @@ class Test_MySQLManager():
 
         db_manager.close()
 
+    def test_select_row_format(self,db_manager):
+        table_name = "prompts_data"
+        result = db_manager.select(table_name, columns=["id", "prompt_id"], row_format="tuple")
+        if result:
+            columns, rows = result
+            print(columns, rows[:3])
+        print(db_manager.select(table_name, columns=["id", "prompt_id"], limit=3, row_format="named"))
+        print(db_manager.select(table_name, columns=["id", "prompt_id"], limit=3, row_format="columnar"))
+        db_manager.close()
+
+    def test_select_without_ping(self,db_manager):
+        table_name = "prompts_data"
+        # ping_interval 内连续查询复用同一连接，不再额外检测存活
+        first = db_manager.select(table_name, conditions="id = %s", params=(1,), fetch_all=False)
+        second = db_manager.select(table_name, conditions="id = %s", params=(1,), fetch_all=False)
+        print(first, second)
+        db_manager.close()
+
+    def test_select_iter(self,db_manager):
+        table_name = "prompts_data"
+        count = 0
+        for row in db_manager.select_iter(table_name, batch_size=100):
+            count += 1
+            if count >= 10:
+                break  # 提前停止，连接应被丢弃
+        print(count)
+        db_manager.close()
+
+    def test_select_pages(self,db_manager):
+        table_name = "prompts_data"
+        saved_cursor = None
+        for rows, next_cursor in db_manager.select_pages(table_name, "id", columns=["prompt_id", "version"], page_size=2):
+            print(rows)
+            saved_cursor = next_cursor
+            break
+        if saved_cursor:
+            # 从保存的游标继续读取
+            for rows, _ in db_manager.select_pages(table_name, "id", page_size=2, cursor=saved_cursor):
+                print(rows)
+        db_manager.close()
+
     def test_update(self,db_manager):
         db_manager.update(table_name, {'age': 31, 'name': 'Alice Smith'}, conditions="id = %s", params=(user1_id,))
 
 
+class Test_MySQLManagerPool():
+
+    @pytest.fixture
+    def db_manager(self):
+        return MySQLManager(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            pool_size = 4,
+            pool_timeout = 5,
+        )
+
+    def test_prepared_statements(self):
+        db_manager = MySQLManager(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            pool_size = 2,
+            prepared_statements = 32,
+        )
+        table_name = "prompts_data"
+        for i in range(1, 20):
+            print(db_manager.select(table_name, conditions="id = %s", params=(i,), fetch_all=False))
+        db_manager.close()
+
+    def test_threaded_select(self,db_manager):
+        table_name = "prompts_data"
+
+        def work(i):
+            return db_manager.select(table_name, conditions="id = %s", params=(i,), fetch_all=False)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(work, range(1, 33)))
+        print(results)
+        assert db_manager.pool._size <= 4
+        db_manager.close()
+
+    def test_parallel_scan(self,db_manager):
+        table_name = "prompts_data"
+        count = 0
+        for rows in db_manager.parallel_scan(table_name, "id", workers=4, columns="id, prompt_id", batch_size=200, yield_batches=True):
+            count += len(rows)
+        print(count)
+        assert db_manager.pool._size <= 4
+        db_manager.close()
+
+    def test_write_behind(self,db_manager):
+        table_name = "prompts_data"
+        failed = []
+        with db_manager.write_behind(
+            table_name, ['prompt_id', 'version', 'timestamp','prompt'],
+            batch_size=200, flush_interval=0.5,
+            on_error=lambda rows, error: failed.extend(rows),
+        ) as writer:
+            for i in range(1000):
+                writer.insert({'prompt_id': f'wb_{i}', 'version': '1.0', 'timestamp': datetime.now(), "prompt": "你好"})
+            writer.flush()
+        print(writer.written_rows, len(failed))
+        db_manager.close()
+
+
+class Test_MySQLManagerReplicas():
+
+    @pytest.fixture
+    def db_manager(self):
+        # 本地测试时主库和副本指向同一实例
+        return MySQLManager(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            pool_size = 2,
+            replicas = [{"host": os.environ.get("MySQL_DB_HOST")}],
+            read_strategy = "least_latency",
+            read_your_writes = 1,
+        )
+
+    def test_read_write_split(self,db_manager):
+        table_name = "prompts_data"
+        print(db_manager.select(table_name, limit=2))
+        db_manager.insert(table_name, {'prompt_id': 'replica_001', 'version': '1.0', 'timestamp': datetime.now(),"prompt":"你好"})
+        # read_your_writes 窗口内走主库
+        print(db_manager.select(table_name, conditions="prompt_id = %s", params=('replica_001',)))
+        db_manager.close()
+
+
+class Test_MySQLManagerQueryCache():
+
+    @pytest.fixture
+    def db_manager(self):
+        return MySQLManager(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            query_cache = QueryCache(maxsize=128, ttl=60, table_ttls={"prompts_data": 10}),
+        )
+
+    def test_cached_select(self,db_manager):
+        table_name = "prompts_data"
+        for _ in range(10):
+            db_manager.select(table_name, conditions="id = %s", params=(1,), fetch_all=False)
+        db_manager.insert(table_name, {'prompt_id': 'cache_001', 'version': '1.0', 'timestamp': datetime.now(),"prompt":"你好"})
+        db_manager.select(table_name, conditions="id = %s", params=(1,), fetch_all=False)
+        print(db_manager.query_cache.stats())
+        db_manager.close()
+
+
 class Test_MySQLManagerWithVersionControler():
     @pytest.fixture
     def db_manager(self):
@@ -111,4 +350,67 @@ class Test_MySQLManagerWithVersionControler():
                     "prompt":"你好33545"}
         )
         print(result,'result')
-        db_manager.close()
\ No newline at end of file
+        db_manager.close()
+
+    def test_save_contents(self,db_manager):
+        result = db_manager.save_contents(
+            table_name = "test",
+            data_list = [{'name': f"db_help_test_00{i % 3}",
+                          'timestamp': datetime.now(),
+                          "prompt": f"你好{i}"} for i in range(6)]
+        )
+        print(result,'result')
+        db_manager.close()
+
+    def test_concurrent_save_content(self):
+        # 每个线程需要独立的连接来运行各自的事务，因此使用连接池
+        db_manager = MySQLManagerWithVersionControler(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            pool_size = 4,
+        )
+
+        def work(i):
+            return db_manager.save_content(
+                table_name = "test",
+                data = {'name': "db_help_test_001", 'timestamp': datetime.now(), "prompt": f"并发{i}"}
+            )
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            versions = list(executor.map(work, range(8)))
+        print(versions)
+        db_manager.close()
+
+    def test_get_latest_many(self,db_manager):
+        result = db_manager.get_latest_many("test", [f"db_help_test_00{i}" for i in range(5)])
+        print(result)
+        result = db_manager.get_versions_many("test", [("db_help_test_001", "1.0"), ("db_help_test_001", "1.1")])
+        print(result)
+        db_manager.close()
+
+    def test_get_content_cached(self):
+        db_manager = MySQLManagerWithVersionControler(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            version_cache = VersionCache(),
+            watermark_interval = 5,
+        )
+        for _ in range(10):
+            result = db_manager.get_content_by_version(
+                target_name = "db_help_test_001",
+                table_name = "test",
+            )
+        print(result, db_manager.version_cache.stats())
+        db_manager.close()
+
+    def test_search_by_time(self,db_manager):
+        start_time = datetime(2025, 1, 1)
+        for row in db_manager.search_by_time("test", start_time, names=["db_help_test_001"], page_size=100):
+            print(row)
+        result = db_manager.count_by_time("test", start_time, bucket="day", by_name=True)
+        print(result)
+        db_manager.close()
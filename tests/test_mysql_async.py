@@ -0,0 +1,59 @@
+import pytest
+import asyncio
+from db_help.mysql_async import AsyncMySQLManager, AsyncMySQLManagerWithVersionControler
+from dotenv import load_dotenv
+import os
+from datetime import datetime
+
+load_dotenv()
+
+
+class Test_AsyncMySQLManager():
+
+    @pytest.fixture
+    def db_manager(self):
+        return AsyncMySQLManager(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            pool_size = 4,
+        )
+
+    @pytest.mark.asyncio
+    async def test_insert(self,db_manager):
+        table_name = "prompts_data"
+        user1_id = await db_manager.insert(table_name, {'prompt_id': 'async_001', 'version': '1.0', 'timestamp': datetime.now(),"prompt":"你好"})
+        print(user1_id)
+        await db_manager.close()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_select(self,db_manager):
+        table_name = "prompts_data"
+        results = await asyncio.gather(*[
+            db_manager.select(table_name, conditions="id = %s", params=(i,), fetch_all=False)
+            for i in range(1, 101)
+        ])
+        print(results)
+        assert db_manager.pool._size <= 4
+        await db_manager.close()
+
+
+class Test_AsyncMySQLManagerWithVersionControler():
+    @pytest.fixture
+    def db_manager(self):
+        return AsyncMySQLManagerWithVersionControler(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_content(self,db_manager):
+        result = await db_manager.get_content_by_version(
+            target_name = "db_help_test_001",
+            table_name = "test",
+        )
+        print(result,'result')
+        await db_manager.close()
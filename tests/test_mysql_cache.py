@@ -0,0 +1,113 @@
+import time
+from db_help.mysql import MySQLManager, QueryCache, VersionCache
+
+
+class FakeCursor:
+    lastrowid = 1
+    rowcount = 1
+
+    def execute(self, query, params=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    不连接数据库的假连接，只记录提交和回滚。
+    """
+
+    def __init__(self):
+        self.in_transaction = False
+        self.commits = 0
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, **kwargs):
+        return FakeCursor()
+
+    def start_transaction(self):
+        self.in_transaction = True
+
+    def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+
+def test_query_cache_lru_eviction():
+    cache = QueryCache(maxsize=2, ttl=None)
+    cache.set("users", "a", [1])
+    cache.set("users", "b", [2])
+    assert cache.get("a") == (True, [1])  # a 变为最近使用，淘汰 b
+    cache.set("users", "c", [3])
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, [1])
+    assert cache.get("c") == (True, [3])
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_query_cache_ttl():
+    cache = QueryCache(ttl=60, table_ttls={"config": 0.01})
+    cache.set("config", "a", [1])
+    cache.set("users", "b", [2])
+    time.sleep(0.05)
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, [2])
+    assert cache.stats()["expirations"] == 1
+
+
+def test_query_cache_invalidate_table():
+    cache = QueryCache()
+    key = QueryCache.make_key("SELECT *  FROM users\nWHERE id = %s", [1])
+    assert key == QueryCache.make_key("SELECT * FROM users WHERE id = %s", (1,))
+    cache.set("users", key, [{"id": 1}])
+    cache.set("orders", "b", [2])
+    cache.invalidate("`Users`")
+    assert cache.get(key) == (False, None)
+    assert cache.get("b") == (True, [2])
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_query_cache_invalidated_after_commit():
+    cache = QueryCache()
+    manager = MySQLManager(query_cache=cache)
+    manager.connection = FakeConnection()
+    with manager.transaction():
+        manager.insert("users", {"name": "a"})
+        # 事务提交前其他线程读到旧数据并写回缓存
+        cache.set("users", "a", [])
+        assert cache.get("a") == (True, [])
+    assert manager.connection.commits == 1
+    assert cache.get("a") == (False, None)
+
+
+def test_version_cache_negative():
+    cache = VersionCache(negative_ttl=0.01)
+    cache.set("prompts", "missing", None, None)
+    cache.set("prompts", "a", "1.5", None)
+    # 命中且值为 None 表示数据库中不存在
+    assert cache.get("prompts", "missing") == (True, None)
+    assert cache.get("prompts", "a", "1.5") == (True, None)
+    time.sleep(0.05)
+    assert cache.get("prompts", "missing") == (False, None)
+    assert cache.get("prompts", "a", "1.5") == (False, None)
+
+
+def test_version_cache_latest_and_invalidate():
+    cache = VersionCache(negative_ttl=60)
+    row = {"name": "a", "version": "1.1"}
+    cache.set("prompts", "a", None, row)
+    assert cache.get("prompts", "a") == (True, row)
+    assert cache.get("prompts", "a", "1.1") == (True, row)
+    cache.set("prompts", "b", None, None)
+    # 写入后负缓存和 latest 指针一起失效
+    cache.invalidate("prompts")
+    assert cache.get("prompts", "a") == (False, None)
+    assert cache.get("prompts", "b") == (False, None)
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,45 @@
+import pytest
+from db_help.mysql_codec import HEADER_ZLIB, ColumnCodec
+
+
+def test_zlib_roundtrip():
+    codec = ColumnCodec(["prompt"], codec="zlib", min_size=16)
+    text = "你是一个乐于助人的助手。" * 50
+    encoded = codec.encode(text)
+    assert encoded[0] == HEADER_ZLIB
+    assert len(encoded) < len(text.encode("utf-8"))
+    assert codec.decode(encoded) == text
+    # 未压缩的旧数据 (BLOB 列中的 UTF-8 文本) 和短文本原样可读
+    assert codec.decode(text.encode("utf-8")) == text
+    assert codec.encode("短") == "短"
+
+
+def test_decode_rows_only_configured_columns():
+    codec = ColumnCodec({"prompts_data": ["prompt"]}, codec="zlib", min_size=0)
+    row = codec.encode_row("prompts_data", {"name": "a" * 100, "prompt": "b" * 100})
+    assert row["name"] == "a" * 100
+    assert codec.decode_rows("prompts_data", row)["prompt"] == "b" * 100
+    assert codec.columns("other_table") == frozenset()
+
+
+def test_zstd_dictionary():
+    pytest.importorskip("zstandard")
+    samples = [f"你是一个翻译助手，请把第 {i} 段文本翻译成英文，保持术语一致。" for i in range(500)]
+    codec = ColumnCodec(["prompt"], codec="zstd", min_size=16)
+    dictionary = codec.train_dictionary(samples, dict_size=4096)
+    encoded = codec.encode(samples[0])
+    restored = ColumnCodec(["prompt"], codec="zstd", dictionaries=[dictionary])
+    assert restored.decode(encoded) == samples[0]
+
+
+def test_zstd_threads():
+    pytest.importorskip("zstandard")
+    from concurrent.futures import ThreadPoolExecutor
+    codec = ColumnCodec(["prompt"], codec="zstd", min_size=16)
+    texts = [f"第 {i} 个提示词，" * 200 for i in range(64)]
+
+    def roundtrip(text):
+        return codec.decode(codec.encode(text)) == text
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(roundtrip, texts))
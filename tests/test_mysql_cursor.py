@@ -0,0 +1,22 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from db_help.mysql import decode_page_cursor, encode_page_cursor
+
+
+def test_page_cursor_roundtrip():
+    key_values = [
+        datetime(2025, 1, 2, 3, 4, 5, 678000),
+        date(2025, 1, 2),
+        timedelta(hours=1, seconds=30),
+        Decimal("12.3400"),
+        b"\x00\xff\xfe",
+        "名称/a+b",
+        42,
+        None,
+    ]
+    token = encode_page_cursor(key_values)
+    # URL 安全，可以直接放进查询参数
+    assert all(c.isalnum() or c in "-_=" for c in token)
+    restored = decode_page_cursor(token)
+    assert restored == key_values
+    assert [type(v) for v in restored] == [type(v) for v in key_values]
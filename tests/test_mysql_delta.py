@@ -0,0 +1,18 @@
+from db_help.mysql_delta import apply_delta, encode_delta, is_delta, parse_delta
+
+
+def test_delta_roundtrip():
+    base = "".join(f"第 {i} 行: 你是一个乐于助人的助手。\n" for i in range(30))
+    text = base.replace("第 7 行", "第七行").replace("第 20 行: 你是", "第 20 行: 你不是") + "新增一行"
+    delta = encode_delta(base, text, snapshot_id=42, depth=3)
+    assert is_delta(delta)
+    assert len(delta) < len(text)
+    snapshot_id, depth, ops = parse_delta(delta)
+    assert (snapshot_id, depth) == (42, 3)
+    assert apply_delta(base, ops) == text
+
+
+def test_plain_text_is_not_delta():
+    assert not is_delta("你是一个乐于助人的助手。")
+    assert not is_delta(None)
+    assert apply_delta("a\n", parse_delta(encode_delta("a\n", "", 1, 1))[2]) == ""
@@ -0,0 +1,39 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from db_help.mysql_export import iter_import_rows, open_export_writer
+
+
+@pytest.mark.parametrize("fmt,compression", [("csv", None), ("csv", "gzip"), ("ndjson", None), ("ndjson", "gzip")])
+def test_export_roundtrip(tmp_path, fmt, compression):
+    path = tmp_path / f"data.{fmt}"
+    rows = [
+        {"id": 1, "prompt": 'a,"b"\nc', "timestamp": datetime(2024, 1, 1, 8, 30), "score": Decimal("1.50")},
+        {"id": 2, "prompt": None, "timestamp": datetime(2024, 1, 2), "score": Decimal("2")},
+    ]
+    writer = open_export_writer(path, fmt, compression)
+    writer.write(rows[:1])
+    writer.write(rows[1:])
+    writer.close()
+
+    columns, imported = iter_import_rows(path, fmt, compression)
+    imported = list(imported)
+    print(imported)
+    assert columns == ["id", "prompt", "timestamp", "score"]
+    assert imported[0][1] == 'a,"b"\nc'
+    assert imported[0][2] == "2024-01-01 08:30:00"
+    assert imported[1][1] is None
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_export_binary_roundtrip(tmp_path, fmt):
+    path = tmp_path / f"data.{fmt}"
+    blob = bytes([0xF8, 0x00, 0x0A]) + "压缩数据".encode("utf-8")
+    rows = [{"id": 1, "data": None}, {"id": 2, "data": blob}]
+    writer = open_export_writer(path, fmt, binary_columns={"data"})
+    writer.write(rows)
+    writer.close()
+
+    columns, imported = iter_import_rows(path, fmt)
+    assert columns == ["id", "data"]
+    assert [row[1] for row in imported] == [None, blob]
@@ -0,0 +1,51 @@
+import pytest
+from db_help.mysql import MySQLManager
+from db_help.mysql_metrics import LatencyHistogram, QueryInstrumentation
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+
+def test_histogram_quantile():
+    histogram = LatencyHistogram(buckets=(0.01, 0.1, 1.0))
+    for value in (0.001, 0.002, 0.05, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1.0) == 3.0
+
+
+def test_export_prometheus():
+    inst = QueryInstrumentation(buckets=(0.1, 1.0), slow_query_threshold=0.5)
+    event = inst.before('SELECT *  FROM t\n WHERE name = "x" AND id = %s', (1,))
+    inst.after(event, row_count=3, acquire_time=0.01, execute_time=0.5, fetch_time=0.09)
+    text = inst.export_prometheus()
+    print(text)
+    assert 'template="SELECT * FROM t WHERE name = \\"x\\" AND id = %s",phase="total",le="1.0"} 1' in text
+    assert len(inst.slow_queries) == 1
+    assert inst.slow_queries[0]["row_count"] == 3
+
+
+class Test_MySQLManagerInstrumentation():
+
+    @pytest.fixture
+    def db_manager(self):
+        return MySQLManager(
+            host = os.environ.get("MySQL_DB_HOST"),
+            user = os.environ.get("MySQL_DB_USER"),
+            password = os.environ.get("MySQL_DB_PASSWORD"),
+            database =  os.environ.get("MySQL_DB_NAME"),
+            instrumentation = QueryInstrumentation(slow_query_threshold=0.2),
+        )
+
+    def test_select_metrics(self,db_manager):
+        events = []
+        db_manager.instrumentation.add_hook(after=events.append)
+        table_name = "prompts_data"
+        for i in range(1, 11):
+            db_manager.select(table_name, conditions="id = %s", params=(i,), fetch_all=False)
+        print(events[-1])
+        print(db_manager.instrumentation.summary())
+        print(db_manager.instrumentation.export_prometheus())
+        db_manager.close()
@@ -0,0 +1,41 @@
+import pytest
+from db_help.mysql import MySQLManager
+from db_help.mysql_shard import HashRing, ShardedMySQLManager, order_by_key
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+
+def test_hash_ring_add_node_moves_few_keys():
+    ring = HashRing(["shard_0", "shard_1", "shard_2"])
+    before = {key: ring.node_for(key) for key in range(3000)}
+    ring.add("shard_3")
+    moved = [key for key in before if ring.node_for(key) != before[key]]
+    assert all(ring.node_for(key) == "shard_3" for key in moved)
+    assert len(moved) < 3000 * 0.4
+
+
+def test_order_by_key():
+    rows = [{"ts": 2, "id": 1}, {"ts": None, "id": 2}, {"ts": 2, "id": 3}, {"ts": 1, "id": 4}]
+    assert [row["id"] for row in sorted(rows, key=order_by_key("ts DESC, id"))] == [1, 3, 4, 2]
+
+
+class Test_ShardedMySQLManager():
+
+    @pytest.fixture
+    def db_manager(self):
+        def shard():
+            return MySQLManager(
+                host = os.environ.get("MySQL_DB_HOST"),
+                user = os.environ.get("MySQL_DB_USER"),
+                password = os.environ.get("MySQL_DB_PASSWORD"),
+                database =  os.environ.get("MySQL_DB_NAME"),
+            )
+        return ShardedMySQLManager({"shard_0": shard(), "shard_1": shard()}, shard_key="prompt_id")
+
+    def test_fan_out_select(self,db_manager):
+        table_name = "prompts_data"
+        print(db_manager.shard_for("prompt_001"))
+        print(db_manager.select(table_name, order_by="timestamp DESC", limit=5))
+        db_manager.close()